@@ -1,17 +1,27 @@
 # BASIC Editor for LASER-310 by odorajbotoj
 # version 1.0.7
 
+import time
+
+startTime = time.perf_counter()
+
+import argparse
 import copy
 import json
+import os
 import struct
+import sys
+import threading
 import tkinter
 import tkinter.filedialog
 import tkinter.messagebox
-import tkinter.scrolledtext
 import tkinter.simpledialog
 import tkinter.ttk
 import wave
 
+import checker
+import packer
+
 allowInput = (
     " QWERTYUIOPASDFGHJKLZXCVBNM1234567890!\"#$%&'()@-=[]/?;+:*\\,<.>"
     "\u2580\u2584\u2588\u258c\u2590\u2596\u2597\u2598\u2599\u259a\u259b\u259c\u259d\u259e\u259f\u25a1\u2191"
@@ -36,6 +46,7 @@ blockChrTransTable = {
     "\u259e": 0x86,
     "\u259f": 0x87,
     "\u25a1": 0x80,
+    "\u2191": 0xD1,  # 和 converter.py 的 {arr} 一样
 }
 
 systemBasicDict = {
@@ -212,6 +223,230 @@ basicDicts = {
     "字符串": stringBasicDict,
     "禁用": blockedBasicDict,
 }
+# 每个分类的按钮文字，启动时只算一次
+basicDictKeys = {k: list(v.keys()) for k, v in basicDicts.items()}
+
+fileVer = "1.0.0"
+
+
+def checkName(name):
+    if len(name) == 0 or len(name) > 15:
+        return False
+    elif name[0] not in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
+        return False
+    else:
+        for i in name:
+            if i not in allowInput:
+                return False
+    return True
+
+
+def makeHead(basicName):
+    bytesArrA = []
+    # 填充开头
+    for i in range(255):
+        bytesArrA.append(0x80)
+    for i in range(5):
+        bytesArrA.append(0xFE)
+    bytesArrA.append(0xF0)  # BASIC text file
+    # 填程序名
+    for i in basicName:
+        geti = blockChrTransTable.get(i)
+        if geti == None:
+            bytesArrA.append(ord(i))
+        else:
+            bytesArrA.append(geti)
+    bytesArrA.append(0x00)
+    return bytesArrA
+
+
+def encodeLine(line):
+    packedLineNum = struct.pack("<I", line["lineNum"]).hex()
+    # 生成头，前两字节留给下一行地址
+    bs = [0x00, 0x00, int(packedLineNum[:2], 16), int(packedLineNum[2:4], 16)]
+    # 填充程序
+    if len(line["blocks"]) > 0 and line["blocks"][0] == "REM":
+        bs.append(0x93)
+        for block in line["blocks"][1:]:
+            for i in block:
+                get2 = blockChrTransTable.get(i)
+                if get2 != None:
+                    bs.append(get2)
+                else:
+                    bs.append(ord(i))
+    else:
+        for block in line["blocks"]:
+            get1 = allBasicDict.get(block)
+            if get1 != None:
+                bs.append(get1)
+            else:
+                for i in block:
+                    get2 = blockChrTransTable.get(i)
+                    if get2 != None:
+                        bs.append(get2)
+                    else:
+                        bs.append(ord(i))
+    # 添加尾
+    bs.append(0x00)
+    return bs
+
+
+def countTokens(line):
+    if len(line["blocks"]) > 0 and line["blocks"][0] == "REM":
+        return 1
+    return sum(1 for block in line["blocks"] if allBasicDict.get(block))
+
+
+def encodeBasic(lines, startAddr, symbols=None):
+    # 生成程序字节码
+    # symbols 不为 None 时顺便记下每行的 (行号, 地址, 长度, 关键字数)
+    basicBytes = []
+    nowAddr = startAddr
+    for line in lines:
+        bs = encodeLine(line)
+        if symbols != None:
+            symbols.append((line["lineNum"], nowAddr, len(bs), countTokens(line)))
+        # 计算地址偏移
+        nowAddr += len(bs)
+        addr = struct.pack("<I", nowAddr).hex()
+        bs[0] = int(addr[:2], 16)
+        bs[1] = int(addr[2:4], 16)
+        # 合并
+        basicBytes.extend(bs)
+    basicBytes.extend([0x00, 0x00])
+    return basicBytes
+
+
+def makeBody(basicBytes, startAddr):
+    bytesArrB = []
+    # 计算校验
+    checksum = 0
+    for i in basicBytes:
+        checksum += i
+    # 填始末地址
+    endAddr = startAddr + len(basicBytes)
+    startAddrHex = struct.pack("<I", startAddr).hex()
+    endAddrHex = struct.pack("<I", endAddr).hex()
+    addrArr = [
+        int(startAddrHex[:2], 16),
+        int(startAddrHex[2:4], 16),
+        int(endAddrHex[:2], 16),
+        int(endAddrHex[2:4], 16),
+    ]
+    for i in addrArr:
+        checksum += i
+    bytesArrB.extend(addrArr)
+    # 填程序段
+    bytesArrB.extend(basicBytes)
+    # 填校验和
+    checksumHex = struct.pack("<I", checksum).hex()
+    bytesArrB.extend([int(checksumHex[:2], 16), int(checksumHex[2:4], 16)])
+    return bytesArrB
+
+
+# 每个字节对应的波形，0 和 1 各 36 个采样
+bitWaves = {
+    "0": b"\xff" * 6 + b"\x00" * 6 + b"\xff" * 12 + b"\x00" * 12,
+    "1": (b"\xff" * 6 + b"\x00" * 6) * 3,
+}
+byteWaves = [
+    b"".join(bitWaves[b] for b in bin(i)[2:].zfill(8)) for i in range(256)
+]
+
+
+def writeMap(filename, symbols, endAddr):
+    # 每行一条 "行号 地址 长度 关键字数"，最后是程序结束地址
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("; line addr len tokens\n")
+        for lineNum, addr, length, tokens in symbols:
+            f.write("{} {:04X} {} {}\n".format(lineNum, addr, length, tokens))
+        f.write("END {:04X}\n".format(endAddr))
+
+
+def writeWAV(filename, bytesArrA, bytesArrB, progress=None, cancel=None):
+    # progress(done, total) 每写 256 字节回调一次；cancel 被置位时中止并返回 False
+    total = len(bytesArrA) + len(bytesArrB)
+    done = 0
+    with wave.open(filename, "w") as wavf:
+        wavf.setnchannels(1)
+        wavf.setsampwidth(1)
+        wavf.setframerate(22050)
+        wavf.writeframes(b"\x80" * 20)
+        for bytesArr in (bytesArrA, bytesArrB):
+            for i in range(0, len(bytesArr), 256):
+                if cancel != None and cancel.is_set():
+                    return False
+                chunk = bytesArr[i : i + 256]
+                wavf.writeframes(b"".join(byteWaves[data] for data in chunk))
+                done += len(chunk)
+                if progress != None:
+                    progress(done, total)
+            if bytesArr is bytesArrA:
+                wavf.writeframes(b"\x00" * 58)  # magic space
+        wavf.writeframes(b"\x80" * 20)
+    return True
+
+
+def exportCLI(argv):
+    # 无界面导出，不创建 Tk 窗口
+    parser = argparse.ArgumentParser(prog="BASICEditor.py export")
+    parser.add_argument("project", help="编辑器保存的 .json 文件")
+    parser.add_argument("--name", required=True, help="程序名")
+    parser.add_argument("--addr", default="7AE9", help="十六进制起始地址")
+    parser.add_argument("-o", "--output", help="输出 wav 文件")
+    parser.add_argument("--map", help="同时输出符号表文件")
+    args = parser.parse_args(argv)
+    if not checkName(args.name):
+        print("invalid Name.")
+        exit(1)
+    try:
+        startAddr = int(args.addr, 16)
+    except ValueError:
+        print("invalid HexStartAddr.")
+        exit(1)
+    if startAddr < 0x7AE9 or startAddr > 0xFFFF:
+        print("invalid HexStartAddr.")
+        exit(1)
+    try:
+        with open(args.project, "r", encoding="utf-8") as f:
+            project = json.loads(f.read())
+        if not isinstance(project, dict) or not isinstance(project.get("lines"), list):
+            raise ValueError("not an editor project.")
+    except (OSError, ValueError) as e:
+        print("cannot read project: {}".format(e))
+        exit(1)
+    if project.get("fileVer") != fileVer:
+        print("fileVer mismatch.")
+        exit(1)
+    output = args.output
+    if output == None:
+        output = args.project.removesuffix(".json") + ".wav"
+    # 和 exportWorker 一样先写临时文件，失败时不留下半个 wav
+    tmpname = output + ".tmp"
+    try:
+        bytesArrA = makeHead(args.name)
+        symbols = []
+        basicBytes = encodeBasic(project["lines"], startAddr, symbols)
+        writeWAV(tmpname, bytesArrA, makeBody(basicBytes, startAddr))
+        os.replace(tmpname, output)
+        if args.map != None:
+            writeMap(args.map, symbols, startAddr + len(basicBytes))
+    except Exception as e:
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        print("export failed: {}".format(e))
+        exit(1)
+
+
+if __name__ == "__main__" and len(sys.argv) > 1:
+    if sys.argv[1] != "export":
+        print(
+            "usage: BASICEditor.py"
+            " [export project.json --name X --addr 7AE9 -o out.wav --map out.map]"
+        )
+        exit(1)
+    exportCLI(sys.argv[2:])
+    exit(0)
 
 # 创建窗口
 root = tkinter.Tk()
@@ -223,8 +458,6 @@ lineNum = 0
 lineInterval = tkinter.IntVar()
 lineInterval.set(10)
 
-fileVer = "1.0.0"
-
 basicObj = {"fileVer": fileVer, "lineNum": 0, "lines": []}
 currentLineObj = {"lineNum": 0, "blocks": []}
 
@@ -232,25 +465,69 @@ currentLineObj = {"lineNum": 0, "blocks": []}
 editFrame = tkinter.LabelFrame(root, text="编辑")
 
 basicFrame = tkinter.LabelFrame(editFrame, text="BASIC")
-basicTextArea = tkinter.scrolledtext.ScrolledText(
-    basicFrame, height=20, width=50, state="disabled"
+# 只渲染可见的几行，滚动由行号下标驱动，程序再长也不拖慢
+viewRows = 20
+view = {"top": 0}
+basicTextArea = tkinter.Text(
+    basicFrame, height=viewRows, width=60, wrap="none", state="disabled"
 )
 basicTextArea.grid(row=0, column=0)
 basicFrame.grid(row=0, column=0, rowspan=8)
 
 
-def updateText():
-    txt = ""
-    for i in basicObj["lines"]:
-        txt += str(i["lineNum"]) + " " + "".join(i["blocks"]) + "\n"
-    txt += (
-        str(currentLineObj["lineNum"]) + " " + "".join(currentLineObj["blocks"]) + "\n"
-    )
+def lineText(i):
+    if i < len(basicObj["lines"]):
+        line = basicObj["lines"][i]
+    else:
+        line = currentLineObj
+    return str(line["lineNum"]) + " " + "".join(line["blocks"])
+
+
+def drawText():
+    total = len(basicObj["lines"]) + 1
+    view["top"] = max(0, min(view["top"], total - viewRows))
+    bottom = min(total, view["top"] + viewRows)
+    txt = "\n".join(lineText(i) for i in range(view["top"], bottom))
     basicTextArea.configure(state="normal")
     basicTextArea.delete("1.0", tkinter.END)
     basicTextArea.insert("1.0", txt)
-    basicTextArea.see(tkinter.END)
     basicTextArea.configure(state="disabled")
+    basicScroll.set(view["top"] / total, bottom / total)
+
+
+def scrollText(*args):
+    total = len(basicObj["lines"]) + 1
+    if args[0] == "moveto":
+        view["top"] = int(float(args[1]) * total)
+    elif args[0] == "scroll":
+        n = int(args[1])
+        if args[2] == "pages":
+            n *= viewRows
+        view["top"] += n
+    drawText()
+
+
+def wheelText(event):
+    if event.num == 4 or event.delta > 0:
+        view["top"] -= 3
+    else:
+        view["top"] += 3
+    drawText()
+    return "break"
+
+
+basicScroll = tkinter.Scrollbar(basicFrame, command=scrollText)
+basicScroll.grid(row=0, column=1, sticky="ns")
+basicTextArea.bind("<MouseWheel>", wheelText)
+basicTextArea.bind("<Button-4>", wheelText)
+basicTextArea.bind("<Button-5>", wheelText)
+
+
+def updateText():
+    # 编辑后滚到末尾
+    view["top"] = len(basicObj["lines"]) + 1 - viewRows
+    drawText()
+    updateMeter()
 
 
 def entryDEL():
@@ -439,14 +716,31 @@ root.bind("<Return>", insertENTER)
 notebook = tkinter.ttk.Notebook(editFrame)
 notebook.grid(row=3, column=1, rowspan=5, columnspan=6)
 
+# 尚未生成按钮的标签页，第一次切换到时再生成
+unbuiltTabs = {}
+
+
+def buildTab(event=None):
+    fr = str(notebook.select())
+    k1 = unbuiltTabs.pop(fr, None)
+    if k1 == None:
+        return
+    ks = basicDictKeys[k1]
+    for i in range(len(ks)):
+        tkinter.Button(
+            notebook.nametowidget(fr),
+            text=ks[i],
+            command=lambda arg=ks[i]: buttonClick(arg),
+        ).grid(row=i // 6, column=i % 6)
+
+
+notebook.bind("<<NotebookTabChanged>>", buildTab)
+
 for k1 in basicDicts:
     fr = tkinter.Frame(editFrame)
-    ks = list(basicDicts[k1].keys())
-    for i in range(len(ks)):
-        tkinter.Button(fr, text=ks[i], command=lambda arg=ks[i]: buttonClick(arg)).grid(
-            row=i // 6, column=i % 6
-        )
+    unbuiltTabs[str(fr)] = k1
     notebook.add(fr, text=k1)
+buildTab()
 
 editFrame.grid(row=1, column=0)
 
@@ -467,6 +761,7 @@ def openFile():
         tkinter.messagebox.showerror("错误", "数据版本不匹配")
         return
     basicObj = copy.deepcopy(backup)
+    resetStats()
     updateText()
 
 
@@ -483,18 +778,6 @@ def saveFile():
         f.write(json.dumps(basicObj))
 
 
-def checkName(name):
-    if len(name) > 15:
-        return False
-    elif name[0] not in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
-        return False
-    else:
-        for i in name:
-            if i not in allowInput:
-                return False
-    return True
-
-
 def exportWAV():
     global basicObj
     basicName = tkinter.simpledialog.askstring(
@@ -505,102 +788,20 @@ def exportWAV():
     if not checkName(basicName):
         tkinter.messagebox.showerror("错误", "不合法的程序名")
         return
-    bytesArrA = []
-    bytesArrB = []
-    # 填充开头
-    for i in range(255):
-        bytesArrA.append(0x80)
-    for i in range(5):
-        bytesArrA.append(0xFE)
-    bytesArrA.append(0xF0)  # BASIC text file
-    # 填程序名
-    for i in basicName:
-        geti = blockChrTransTable.get(i)
-        if geti == None:
-            bytesArrA.append(ord(i))
-        else:
-            bytesArrA.append(geti)
-    bytesArrA.append(0x00)
+    bytesArrA = makeHead(basicName)
     # 问开始地址
     startAddr = tkinter.simpledialog.askinteger(
         title="输入起始地址",
         prompt="请输入程序起始地址\n默认 0x7AE9",
-        initialvalue=0x7AE9,
+        initialvalue=getStartAddr() or 0x7AE9,
         minvalue=0x7AE9,
         maxvalue=0xFFFF,
     )
     if startAddr == None:
         return
-    # 准备校验
-    checksum = 0
-    # 生成程序字节码
-    basicBytes = []
-    nowAddr = startAddr
-    for line in basicObj["lines"]:
-        packedLineNum = struct.pack("<I", line["lineNum"]).hex()
-        # 生成头
-        bs = [0x00, 0x00, int(packedLineNum[:2], 16), int(packedLineNum[2:4], 16)]
-        # 填充程序
-        if line["blocks"][0] == "REM":
-            bs.append(0x93)
-            for block in line["blocks"][1:]:
-                for i in block:
-                    get2 = blockChrTransTable.get(i)
-                    if get2 != None:
-                        bs.append(get2)
-                    else:
-                        bs.append(ord(i))
-        else:
-            for block in line["blocks"]:
-                get1 = allBasicDict.get(block)
-                if get1 != None:
-                    bs.append(get1)
-                else:
-                    for i in block:
-                        get2 = blockChrTransTable.get(i)
-                        if get2 != None:
-                            bs.append(get2)
-                        else:
-                            bs.append(ord(i))
-        # 添加尾
-        bs.append(0x00)
-        # 计算地址偏移
-        nowAddr += len(bs)
-        addr = struct.pack("<I", nowAddr).hex()
-        bs[0] = int(addr[:2], 16)
-        bs[1] = int(addr[2:4], 16)
-        # 合并
-        basicBytes.extend(bs)
-    basicBytes.extend([0x00, 0x00])
-    # 计算校验
-    for i in basicBytes:
-        checksum += i
-    # 填始末地址
-    endAddr = startAddr + len(basicBytes)
-    startAddrHex = struct.pack("<I", startAddr).hex()
-    endAddrHex = struct.pack("<I", endAddr).hex()
-    addrArr = [
-        int(startAddrHex[:2], 16),
-        int(startAddrHex[2:4], 16),
-        int(endAddrHex[:2], 16),
-        int(endAddrHex[2:4], 16),
-    ]
-    for i in addrArr:
-        checksum += i
-    bytesArrB.extend(addrArr)
-    # 填程序段
-    bytesArrB.extend(basicBytes)
-    # 填校验和
-    checksumHex = struct.pack("<I", checksum).hex()
-    bytesArrB.extend([int(checksumHex[:2], 16), int(checksumHex[2:4], 16)])
-    # 填结束段
-    # for i in range(20):
-    #    bytesArrB.append(0x00)
-    # DEBUG
-    # print(bytesArr)
-    # print(len(basicBytes), basicBytes)
-    # print(len(addrArr), addrArr)
-    # print(checksum, checksumHex)
+    symbols = []
+    basicBytes = encodeBasic(basicObj["lines"], startAddr, symbols)
+    bytesArrB = makeBody(basicBytes, startAddr)
     # 生成wav
     filename = tkinter.filedialog.asksaveasfilename(
         title="保存",
@@ -610,52 +811,273 @@ def exportWAV():
     )
     if filename == "":
         return
-    with wave.open(filename, "w") as wavf:
-        wavf.setnchannels(1)
-        wavf.setsampwidth(1)
-        wavf.setframerate(22050)
-        wavf.writeframes(b"\x80" * 20)
-        for data in bytesArrA:
-            binaries = bin(data)[2:].zfill(8)
-            for b in binaries:
-                if b == "0":
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 12)
-                    wavf.writeframes(b"\x00" * 12)
-                if b == "1":
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-        wavf.writeframes(b"\x00" * 58)  # magic space
-        for data in bytesArrB:
-            binaries = bin(data)[2:].zfill(8)
-            for b in binaries:
-                if b == "0":
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 12)
-                    wavf.writeframes(b"\x00" * 12)
-                if b == "1":
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-        wavf.writeframes(b"\x80" * 20)
-    tkinter.messagebox.showinfo("成功", "成功保存到 wav 文件")
+    exportJob["cancel"].clear()
+    exportJob["done"] = 0
+    exportJob["total"] = 0
+    exportJob["result"] = None
+    mapInfo = None
+    if mapVar.get():
+        mapInfo = (symbols, startAddr + len(basicBytes))
+    exportJob["thread"] = threading.Thread(
+        target=exportWorker,
+        args=(filename, bytesArrA, bytesArrB, mapInfo),
+        daemon=True,
+    )
+    exportJob["thread"].start()
+    exportButton.configure(state="disabled")
+    cancelButton.configure(state="normal")
+    root.after(100, pollExport)
+
+
+# 后台导出，界面线程只通过 root.after 轮询进度，不在工作线程里碰 tkinter
+exportJob = {
+    "thread": None,
+    "cancel": threading.Event(),
+    "done": 0,
+    "total": 0,
+    "result": None,
+}
+
+
+def exportProgress(done, total):
+    exportJob["done"] = done
+    exportJob["total"] = total
+
+
+def exportWorker(filename, bytesArrA, bytesArrB, mapInfo=None):
+    # 先写到同目录的临时文件，成功后再原子地改名
+    # mapInfo 为 (symbols, endAddr) 时，wav 写成后在旁边写 .map 符号表
+    # 用 open 建临时文件，权限和直接写入时一样
+    result = "ok"
+    tmpname = filename + ".tmp"
+    try:
+        if writeWAV(
+            tmpname, bytesArrA, bytesArrB, exportProgress, exportJob["cancel"]
+        ):
+            os.replace(tmpname, filename)
+            if mapInfo != None:
+                writeMap(filename.removesuffix(".wav") + ".map", *mapInfo)
+        else:
+            os.remove(tmpname)
+            result = "cancel"
+    except Exception as e:
+        # 任何错误都要交回结果，否则 pollExport 会一直等下去
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+        result = e
+    exportJob["result"] = result
+
+
+def pollExport():
+    result = exportJob["result"]
+    if result == None:
+        if exportJob["total"] > 0:
+            statusVar.set(
+                "导出中 {:.0f}%".format(exportJob["done"] * 100 / exportJob["total"])
+            )
+        root.after(100, pollExport)
+        return
+    exportButton.configure(state="normal")
+    cancelButton.configure(state="disabled")
+    if result == "ok":
+        statusVar.set("导出完成")
+        tkinter.messagebox.showinfo("成功", "成功保存到 wav 文件")
+    elif result == "cancel":
+        statusVar.set("导出已取消")
+    else:
+        statusVar.set("导出失败")
+        tkinter.messagebox.showerror("错误", "导出失败\n" + str(result))
+
+
+def cancelExport():
+    exportJob["cancel"].set()
+
+
+def importBinary():
+    # REM 方式要求数据行在程序最前面，所以只能导入到空程序里
+    if len(basicObj["lines"]) > 0 or len(currentLineObj["blocks"]) > 0:
+        tkinter.messagebox.showerror("错误", "只能导入到空程序里")
+        return
+    startAddr = getStartAddr()
+    if startAddr == None:
+        tkinter.messagebox.showerror("错误", "起始地址无效")
+        return
+    filename = tkinter.filedialog.askopenfilename(title="导入二进制")
+    if len(filename) == 0:
+        return
+    destStr = tkinter.simpledialog.askstring("目标地址", "请输入解包到的十六进制地址")
+    if destStr == None:
+        return
+    useREM = tkinter.messagebox.askyesno(
+        "打包方式", "用 REM 打包？\n是：REM，磁带更短，解包更慢\n否：DATA"
+    )
+    with open(filename, "rb") as f:
+        data = f.read()
+    reports = []
+    try:
+        dest = int(destStr, 16)
+        for mode in ("data", "rem"):
+            lines, r = packer.pack(
+                data, dest, startAddr, mode, lineInterval.get(), lineInterval.get()
+            )
+            reports.append(packer.formatReport(mode, r))
+            if (mode == "rem") == useREM:
+                chosen = lines
+    except ValueError as e:
+        tkinter.messagebox.showerror("错误", str(e))
+        return
+    if chosen[-1][0] > 65530:
+        tkinter.messagebox.showerror("超长", "行号 > 65530")
+        return
+    for lineNum, parts in chosen:
+        basicObj["lines"].append({"lineNum": lineNum, "blocks": parts})
+    basicObj["lineNum"] = chosen[-1][0]
+    updateText()
+    info = "\n".join(reports)
+    if useREM:
+        info += "\n导出时起始地址须为 0x{:04X}".format(startAddr)
+    tkinter.messagebox.showinfo("导入完成", info)
 
 
 # 文件操作区
 fileActionFrame = tkinter.LabelFrame(root, text="文件操作")
 tkinter.Button(fileActionFrame, text="打开文件", command=openFile).grid(row=0, column=0)
 tkinter.Button(fileActionFrame, text="保存文件", command=saveFile).grid(row=0, column=1)
-tkinter.Button(fileActionFrame, text="导出WAV", command=exportWAV).grid(row=0, column=2)
+exportButton = tkinter.Button(fileActionFrame, text="导出WAV", command=exportWAV)
+exportButton.grid(row=0, column=2)
+tkinter.Label(fileActionFrame, text="起始地址 0x").grid(row=0, column=3)
+startAddrVar = tkinter.StringVar()
+startAddrVar.set("7AE9")
+tkinter.Entry(fileActionFrame, textvariable=startAddrVar, width=6).grid(
+    row=0, column=4
+)
+cancelButton = tkinter.Button(
+    fileActionFrame, text="取消导出", command=cancelExport, state="disabled"
+)
+cancelButton.grid(row=0, column=5)
+tkinter.Button(fileActionFrame, text="导入二进制", command=importBinary).grid(
+    row=0, column=6
+)
+mapVar = tkinter.BooleanVar()
+tkinter.Checkbutton(fileActionFrame, text="导出符号表", variable=mapVar).grid(
+    row=0, column=7
+)
 fileActionFrame.grid(row=0, column=0)
 
+# 状态栏
+statusFrame = tkinter.Frame(root)
+meterVar = tkinter.StringVar()
+meterLabel = tkinter.Label(statusFrame, textvariable=meterVar, anchor="w")
+meterLabel.grid(row=0, column=0, sticky="w")
+statusVar = tkinter.StringVar()
+tkinter.Label(statusFrame, textvariable=statusVar, anchor="e").grid(
+    row=0, column=1, sticky="e"
+)
+lintVar = tkinter.StringVar()
+tkinter.Label(statusFrame, textvariable=lintVar, anchor="w", fg="red").grid(
+    row=1, column=0, columnspan=2, sticky="w"
+)
+statusFrame.columnconfigure(0, weight=1)
+statusFrame.grid(row=2, column=0, sticky="we")
+
+# 每行的行号和编码后的字节数，和 basicObj["lines"] 一一对应
+# 编辑只会在末尾增删行，所以每次只需算新增或删掉的那一行
+lineStats = []
+meterTotals = {"bytes": 0}
+lintCache = checker.newCache(blockedBasicDict)
+# 0 和 1 的波形都是 36 个采样，一个字节固定 8 * 36 个采样
+byteFrames = 8 * 36
+headLen = len(makeHead(""))
+
+
+def getStartAddr():
+    try:
+        startAddr = int(startAddrVar.get(), 16)
+    except ValueError:
+        return None
+    if startAddr < 0x7AE9 or startAddr > 0xFFFF:
+        return None
+    return startAddr
+
+
+def resetStats():
+    lineStats.clear()
+    meterTotals["bytes"] = 0
+    lintCache.clear()
+    lintCache.update(checker.newCache(blockedBasicDict))
+
+
+def updateLint():
+    count = lintCache["count"]
+    first = None
+    if count > 0:
+        # 只有出问题的行在 problems 里，取第一个不用扫描全部行
+        lineNum, msgs = next(iter(lintCache["problems"].items()))
+        first = (lineNum, msgs[0])
+    # 正在编辑的行还没有行号，只做本行检查
+    static, targets = checker.checkCode(
+        lintCache, lineText(len(basicObj["lines"])), encodeLine(currentLineObj)[4:-1]
+    )
+    count += len(static)
+    if first == None and len(static) > 0:
+        first = ("*", static[0])
+    if first == None:
+        lintVar.set("")
+    else:
+        lintVar.set("{} 个问题  {}: {}".format(count, first[0], first[1]))
+
+
+def updateMeter(*args):
+    lines = basicObj["lines"]
+    while len(lineStats) > len(lines):
+        stat = lineStats.pop()
+        meterTotals["bytes"] -= stat["bytes"]
+        checker.removeLine(lintCache, stat["lineNum"])
+    while len(lineStats) < len(lines):
+        line = lines[len(lineStats)]
+        bs = encodeLine(line)
+        lineStats.append({"lineNum": line["lineNum"], "bytes": len(bs)})
+        meterTotals["bytes"] += len(bs)
+        checker.setLine(
+            lintCache, line["lineNum"], lineText(len(lineStats) - 1), bs[4:-1]
+        )
+    updateLint()
+    startAddr = getStartAddr()
+    if startAddr == None:
+        meterVar.set("起始地址无效")
+        meterLabel.configure(fg="red")
+        return
+    progBytes = meterTotals["bytes"] + 2
+    # 正在编辑的行也算进去，打字时就能看到变化
+    if len(currentLineObj["blocks"]) > 0:
+        progBytes += len(encodeLine(currentLineObj))
+    endAddr = startAddr + progBytes
+    # 头 + 程序名(不计) + 始末地址 + 程序 + 校验和，前后各 20 静音，中间 58 间隔
+    frames = 20 + headLen * byteFrames + 58 + (4 + progBytes + 2) * byteFrames + 20
+    meterVar.set(
+        "{} 字节  结束 0x{:04X}  剩余 {}  约 {:.1f} 秒 / {:.0f} KB".format(
+            progBytes,
+            endAddr,
+            0x10000 - endAddr,
+            frames / 22050,
+            (frames + 44) / 1024,
+        )
+    )
+    if endAddr > 0x10000:
+        meterLabel.configure(fg="red")
+    else:
+        meterLabel.configure(fg="black")
+
+
+startAddrVar.trace_add("write", updateMeter)
+updateMeter()
+
+
+def reportStartup():
+    statusVar.set("启动耗时 {:.0f} ms".format((time.perf_counter() - startTime) * 1000))
+
+
+root.after_idle(reportStartup)
+
 # 窗口事件循环
 root.mainloop()
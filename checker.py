@@ -0,0 +1,117 @@
+# checker
+# static checks on tokenized LASER 310 BASIC lines
+# shared by converter.py and BASICEditor.py
+# by odorajbotoj
+
+# results are cached per line number. a line is re-checked only when its
+# text changes, or when a line number it jumps to appears or disappears.
+
+maxLineLen = 60
+
+jumpTokens = {0x8D: "GOTO", 0x91: "GOSUB", 0xCA: "THEN", 0x95: "ELSE"}
+
+
+def newCache(blockedBasicDict):
+    return {
+        "blocked": {v: k for k, v in blockedBasicDict.items()},
+        "lines": {},  # lineNum -> {"text", "static", "targets"}
+        "refs": {},  # target lineNum -> set of lineNums jumping there
+        "problems": {},  # lineNum -> list of messages, only lines with problems
+        "count": 0,
+    }
+
+
+def checkCode(cache, text, code):
+    # returns (problems, targets) which only depend on the line itself
+    problems = []
+    targets = []
+    if len(text) > maxLineLen:
+        problems.append("line longer than {} chars.".format(maxLineLen))
+    if len(code) > 0 and code[0] == 0x93:  # REM
+        return problems, targets
+    inQuote = False
+    i = 0
+    while i < len(code):
+        c = code[i]
+        i += 1
+        if c == 0x22:
+            inQuote = not inQuote
+        elif inQuote:
+            continue
+        elif c == 0xFB:  # ' comment
+            break
+        elif c in cache["blocked"]:
+            problems.append("blocked token {}.".format(cache["blocked"][c]))
+        elif c in jumpTokens:
+            while i < len(code) and code[i] == 0x20:
+                i += 1
+            j = i
+            while i < len(code) and 0x30 <= code[i] <= 0x39:
+                i += 1
+            if i > j:
+                targets.append(int(bytes(code[j:i])))
+            elif c == 0x8D or c == 0x91:
+                problems.append("{} without line number.".format(jumpTokens[c]))
+    if inQuote:
+        problems.append("unbalanced quote.")
+    return problems, targets
+
+
+def recheck(cache, lineNum):
+    line = cache["lines"][lineNum]
+    problems = list(line["static"])
+    for t in line["targets"]:
+        if t not in cache["lines"]:
+            problems.append("jump to missing line {}.".format(t))
+    cache["count"] += len(problems) - len(cache["problems"].get(lineNum, []))
+    if len(problems) > 0:
+        cache["problems"][lineNum] = problems
+    else:
+        cache["problems"].pop(lineNum, None)
+
+
+def setLine(cache, lineNum, text, code):
+    old = cache["lines"].get(lineNum)
+    if old != None:
+        if old["text"] == text:
+            return
+        for t in old["targets"]:
+            cache["refs"][t].discard(lineNum)
+    static, targets = checkCode(cache, text, code)
+    cache["lines"][lineNum] = {"text": text, "static": static, "targets": targets}
+    for t in targets:
+        cache["refs"].setdefault(t, set()).add(lineNum)
+    recheck(cache, lineNum)
+    if old == None:
+        for ref in cache["refs"].get(lineNum, ()):
+            if ref != lineNum:
+                recheck(cache, ref)
+
+
+def removeLine(cache, lineNum):
+    old = cache["lines"].pop(lineNum, None)
+    if old == None:
+        return
+    for t in old["targets"]:
+        cache["refs"][t].discard(lineNum)
+    cache["count"] -= len(cache["problems"].pop(lineNum, []))
+    for ref in cache["refs"].get(lineNum, ()):
+        recheck(cache, ref)
+
+
+def syncLines(cache, lines):
+    # lines is a list of (lineNum, text, code)
+    seen = set()
+    for lineNum, text, code in lines:
+        seen.add(lineNum)
+        setLine(cache, lineNum, text, code)
+    for lineNum in [i for i in cache["lines"] if i not in seen]:
+        removeLine(cache, lineNum)
+
+
+def allProblems(cache):
+    problems = []
+    for lineNum in sorted(cache["problems"]):
+        for msg in cache["problems"][lineNum]:
+            problems.append((lineNum, msg))
+    return problems
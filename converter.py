@@ -4,10 +4,15 @@
 # version 2
 # by odorajbotoj
 
-import sys
+import argparse
+import os
 import struct
+import time
 import wave
 
+import checker
+import packer
+
 allowInput = list(" QWERTYUIOPASDFGHJKLZXCVBNM1234567890!\"#$%&'()@-=[]/?;+:*\\,<.>")
 
 specialChars = {
@@ -170,42 +175,34 @@ allBasicDict = {
     **mediaBasicDict,
     **variableBasicDict,
     **operatorBasicDict,
-    **mathBasicDict,
+    # before math, or USING would be tokenized as U, SIN, G
     **stringBasicDict,
+    **mathBasicDict,
     **blockedBasicDict,
 }
 
-if __name__ == "__main__":
-    # check args
-    if len(sys.argv) != 5:
-        print("need TxtFile and Name and HexStartAddr and WavFile.")
-        exit(1)
-    file = sys.argv[1]
-    name = sys.argv[2]
-    startaddr = int(sys.argv[3], 16)
-    wav = sys.argv[4]
-    # check name
+
+def checkName(name):
     if len(name) > 15:
-        print("Name too long.")
-        exit(1)
+        raise ValueError("Name too long.")
     elif name[0] not in "ABCDEFGHIJKLMNOPQRSTUVWXYZ":
-        print("invalid first char in Name.")
-        exit(1)
+        raise ValueError("invalid first char in Name.")
     else:
         nameCopy = name
         for i in list(specialChars.keys()):
             nameCopy = nameCopy.replace(i, "")
         for i in nameCopy:
             if i not in allowInput:
-                print("invalid char {} in Name.".format(i))
-                exit(1)
-    # check startaddr
+                raise ValueError("invalid char {} in Name.".format(i))
+
+
+def checkStartAddr(startaddr):
     if startaddr < 0x7AE9 or startaddr > 0xFFFF:
-        print("invalid HexStartAddr.")
-        exit(1)
-    # convert begin
+        raise ValueError("invalid HexStartAddr.")
+
+
+def makeHead(name):
     bytesArrA = []
-    bytesArrB = []
     # fill start
     for i in range(255):
         bytesArrA.append(0x80)
@@ -219,57 +216,79 @@ if __name__ == "__main__":
     for i in list(nameCopy):
         bytesArrA.append(ord(i))
     bytesArrA.append(0x00)
-    # prepare for checksum
-    checksum = 0
-    # read input file
-    fi = open(file, "r", encoding="utf-8")
-    content = fi.read().split("\n")
+    return bytesArrA
+
+
+def tokenizeLine(line):
+    # returns (lineNum, code, tokens) or None for lines without code
+    line = line.strip()
+    lineSplit = line.split(" ", 1)
+    if len(lineSplit) != 2:
+        return None
+    lineNum = 0
+    try:
+        lineNum = int(lineSplit[0])
+    except ValueError:
+        raise ValueError("invalid line number {}.".format(lineSplit[0]))
+    code = []
+    tokens = 0
+    lineSplit[1] = lineSplit[1].strip()
+    if lineSplit[1].startswith("REM "):
+        code.append(0x93)  # REM is 0x93
+        tokens = 1
+        lineSplit[1] = lineSplit[1].removeprefix("REM")
+        for k, v in specialChars.items():
+            lineSplit[1] = lineSplit[1].replace(k, chr(v))
+        for i in list(lineSplit[1]):
+            if ord(i) > 0xFF or (ord(i) < 0x80 and i not in allowInput):
+                raise ValueError("invalid char {}.".format(i))
+            code.append(ord(i))
+    else:
+        blocks = lineSplit[1].split('"')
+        for i in range(len(blocks)):
+            if i % 2 == 0:
+                for k, v in allBasicDict.items():
+                    if k in blocks[i]:
+                        if k not in specialChars:
+                            tokens += blocks[i].count(k)
+                        blocks[i] = blocks[i].replace(k, chr(v))
+            else:
+                for k, v in specialChars.items():
+                    blocks[i] = blocks[i].replace(k, chr(v))
+        lineContent = '"'.join(blocks)
+        for i in list(lineContent):
+            if ord(i) > 0xFF or (ord(i) < 0x80 and i not in allowInput):
+                raise ValueError("invalid char {}.".format(i))
+            code.append(ord(i))
+    return lineNum, code, tokens
+
+
+def encodeLines(content, startaddr, lineCache=None, symbols=None):
+    # lineCache maps line text to its tokenized form, so that only changed
+    # lines are tokenized again. it is pruned to the lines of this run.
+    # symbols, if given, gets (lineNum, addr, length, tokens) for every line.
+    fresh = {}
     # generate program bin code
     basicBytes = []
     nowAddr = startaddr
     for line in content:
-        line = line.strip()
-        lineSplit = line.split(" ", 1)
-        if len(lineSplit) != 2:
+        if lineCache != None and line in lineCache:
+            tokenized = lineCache[line]
+        else:
+            tokenized = tokenizeLine(line)
+        fresh[line] = tokenized
+        if tokenized == None:
             continue
-        lineNum = 0
-        try:
-            lineNum = int(lineSplit[0])
-        except:
-            print("invalid line number {}.".format(lineSplit[0]))
-            exit(1)
+        lineNum, code, tokens = tokenized
         packedLineNum = struct.pack("<I", lineNum).hex()
         # generate header of a line
         bs = [0x00, 0x00, int(packedLineNum[:2], 16), int(packedLineNum[2:4], 16)]
         # fill the code
-        lineSplit[1] = lineSplit[1].strip()
-        if lineSplit[1].startswith("REM "):
-            bs.append(0x93)  # REM is 0x93
-            lineSplit[1] = lineSplit[1].removeprefix("REM")
-            for k, v in specialChars.items():
-                lineSplit[1] = lineSplit[1].replace(k, chr(v))
-            for i in list(lineSplit[0]):
-                if ord(i) < 0x80 and i not in allowInput:
-                    print("invalid char {}.".format(i))
-                    exit(1)
-                bs.append(ord(i))
-        else:
-            blocks = lineSplit[1].split('"')
-            for i in range(len(blocks)):
-                if i % 2 == 0:
-                    for k, v in allBasicDict.items():
-                        blocks[i] = blocks[i].replace(k, chr(v))
-                else:
-                    for k, v in specialChars.items():
-                        blocks[i] = blocks[i].replace(k, chr(v))
-            lineContent = '"'.join(blocks)
-            for i in list(lineContent):
-                if ord(i) < 0x80 and i not in allowInput:
-                    print("invalid char {}.".format(i))
-                    exit(1)
-                bs.append(ord(i))
+        bs.extend(code)
         # add end
         bs.append(0x00)
+        if symbols != None:
+            symbols.append((lineNum, nowAddr, len(bs), tokens))
         # compute address
         nowAddr += len(bs)
         addr = struct.pack("<I", nowAddr).hex()
@@ -278,7 +297,16 @@ if __name__ == "__main__":
         # all in one
         basicBytes.extend(bs)
     basicBytes.extend([0x00, 0x00])
+    if lineCache != None:
+        lineCache.clear()
+        lineCache.update(fresh)
+    return basicBytes
+
+
+def makeBody(basicBytes, startaddr):
+    bytesArrB = []
     # checksum
+    checksum = 0
     for i in basicBytes:
         checksum += i
     # fill start and end address
@@ -299,40 +327,221 @@ if __name__ == "__main__":
     # fill checksum
     checksumHex = struct.pack("<I", checksum).hex()
     bytesArrB.extend([int(checksumHex[:2], 16), int(checksumHex[2:4], 16)])
+    return bytesArrB
+
+
+# waveform of every byte, both 0 and 1 are 36 samples long
+bitWaves = {
+    "0": b"\xff" * 6 + b"\x00" * 6 + b"\xff" * 12 + b"\x00" * 12,
+    "1": (b"\xff" * 6 + b"\x00" * 6) * 3,
+}
+byteWaves = [
+    b"".join(bitWaves[b] for b in bin(i)[2:].zfill(8)) for i in range(256)
+]
+
+
+def writeWAV(wav, bytesArrA, bytesArrB):
     with wave.open(wav, "w") as wavf:
         wavf.setnchannels(1)
         wavf.setsampwidth(1)
         wavf.setframerate(22050)
         wavf.writeframes(b"\x80" * 20)
-        for data in bytesArrA:
-            binaries = bin(data)[2:].zfill(8)
-            for b in binaries:
-                if b == "0":
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 12)
-                    wavf.writeframes(b"\x00" * 12)
-                if b == "1":
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
+        wavf.writeframes(b"".join(byteWaves[data] for data in bytesArrA))
         wavf.writeframes(b"\x00" * 58)  # magic space
-        for data in bytesArrB:
-            binaries = bin(data)[2:].zfill(8)
-            for b in binaries:
-                if b == "0":
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 12)
-                    wavf.writeframes(b"\x00" * 12)
-                if b == "1":
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
-                    wavf.writeframes(b"\xff" * 6)
-                    wavf.writeframes(b"\x00" * 6)
+        wavf.writeframes(b"".join(byteWaves[data] for data in bytesArrB))
         wavf.writeframes(b"\x80" * 20)
+
+
+def writeMap(mapFile, symbols, endAddr):
+    # one "lineNum addr length tokens" row per line, then the end address
+    with open(mapFile, "w", encoding="utf-8") as f:
+        f.write("; line addr len tokens\n")
+        for lineNum, addr, length, tokens in symbols:
+            f.write("{} {:04X} {} {}\n".format(lineNum, addr, length, tokens))
+        f.write("END {:04X}\n".format(endAddr))
+
+
+def makeVZ(name, startaddr, basicBytes):
+    # VZ snapshot: magic, 17 bytes of name, file type, start address, program
+    nameBytes = makeHead(name)[261:]
+    return (
+        b"VZF0"
+        + bytes(nameBytes[:16]).ljust(17, b"\x00")
+        + bytes([0xF0])  # BASIC text file
+        + struct.pack("<H", startaddr)
+        + bytes(basicBytes)
+    )
+
+
+def writeVZ(vz, name, startaddr, basicBytes):
+    with open(vz, "wb") as f:
+        f.write(makeVZ(name, startaddr, basicBytes))
+
+
+def writeOutput(out, name, startaddr, basicBytes):
+    # pick WAV or VZ by extension, write to a temp file and rename it in place
+    # so that an emulator watching the output never loads half a file
+    tmp = out + ".tmp"
+    try:
+        if out.lower().endswith(".vz"):
+            writeVZ(tmp, name, startaddr, basicBytes)
+        else:
+            writeWAV(tmp, makeHead(name), makeBody(basicBytes, startaddr))
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    os.replace(tmp, out)
+
+
+def packBinary(binFile, dest, startaddr, mode):
+    # packed lines go first, numbered from 0, for the REM loader to find them
+    with open(binFile, "rb") as f:
+        data = f.read()
+    lines, r = packer.pack(data, dest, startaddr, mode)
+    print(packer.formatReport(mode, r))
+    return ["{} {}".format(lineNum, "".join(parts)) for lineNum, parts in lines]
+
+
+def prependLines(prefix, content):
+    if len(prefix) == 0:
+        return content
+    lastNum = int(prefix[-1].split(" ", 1)[0])
+    for line in content:
+        tokenized = tokenizeLine(line)
+        if tokenized != None:
+            if tokenized[0] <= lastNum:
+                raise ValueError("program must start after line {}.".format(lastNum))
+            break
+    return prefix + content
+
+
+def watch(file, name, startaddr, out, prefix=[], mapFile=None):
+    lineCache = {}
+    lastMtime = None
+    print("watching {}, Ctrl+C to stop.".format(file))
+    while True:
+        try:
+            mtime = os.stat(file).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime != None and mtime != lastMtime:
+            lastMtime = mtime
+            begin = time.perf_counter()
+            try:
+                with open(file, "r", encoding="utf-8") as fi:
+                    content = prependLines(prefix, fi.read().split("\n"))
+                symbols = [] if mapFile != None else None
+                basicBytes = encodeLines(content, startaddr, lineCache, symbols)
+                writeOutput(out, name, startaddr, basicBytes)
+                if mapFile != None:
+                    writeMap(mapFile, symbols, startaddr + len(basicBytes))
+            except (ValueError, OSError) as e:
+                print(e)
+            else:
+                print(
+                    "{} bytes -> {} in {:.1f} ms".format(
+                        len(basicBytes), out, (time.perf_counter() - begin) * 1000
+                    )
+                )
+        time.sleep(0.05)
+
+
+def checkFile(content):
+    # lint the listing, returns a list of (lineNum, message)
+    problems = []
+    cache = checker.newCache(blockedBasicDict)
+    lines = []
+    lastNum = -1
+    for line in content:
+        try:
+            tokenized = tokenizeLine(line)
+        except ValueError as e:
+            problems.append((line.strip().split(" ", 1)[0], str(e)))
+            continue
+        if tokenized == None:
+            continue
+        lineNum, code, tokens = tokenized
+        if lineNum <= lastNum:
+            problems.append((lineNum, "line number not increasing."))
+        lastNum = lineNum
+        # measure the line as listed on the machine, one char per {xxx} escape
+        text = "{} {}".format(lineNum, line.strip().split(" ", 1)[1].strip())
+        for k, v in specialChars.items():
+            text = text.replace(k, chr(v))
+        lines.append((lineNum, text, code))
+    checker.syncLines(cache, lines)
+    problems.extend(checker.allProblems(cache))
+    return problems
+
+
+if __name__ == "__main__":
+    # check args
+    parser = argparse.ArgumentParser(
+        usage="%(prog)s [--watch] [--pack BinFile --pack-to HexAddr] [--map MapFile]"
+        " TxtFile Name HexStartAddr WavFile | %(prog)s --check TxtFile"
+    )
+    parser.add_argument("file", nargs="?")
+    parser.add_argument("name", nargs="?")
+    parser.add_argument("startaddr", nargs="?")
+    parser.add_argument("wav", nargs="?")
+    parser.add_argument("--check", action="store_true", help="only lint TxtFile")
+    parser.add_argument(
+        "--watch", action="store_true", help="convert again whenever TxtFile changes"
+    )
+    parser.add_argument("--pack", help="binary file to put in front of the program")
+    parser.add_argument("--pack-to", help="hex address the binary is unpacked to")
+    parser.add_argument("--pack-mode", choices=["data", "rem"], default="data")
+    parser.add_argument("--map", help="also write line addresses to this file")
+    args = parser.parse_args()
+    if args.check:
+        if args.file == None:
+            print("need TxtFile.")
+            exit(1)
+        with open(args.file, "r", encoding="utf-8") as fi:
+            problems = checkFile(fi.read().split("\n"))
+        for lineNum, msg in problems:
+            print("{}: {}".format(lineNum, msg))
+        exit(1 if len(problems) > 0 else 0)
+    if args.wav == None:
+        print("need TxtFile and Name and HexStartAddr and WavFile.")
+        exit(1)
+    file = args.file
+    name = args.name
+    wav = args.wav
+    try:
+        startaddr = int(args.startaddr, 16)
+    except ValueError:
+        print("invalid HexStartAddr.")
+        exit(1)
+    prefix = []
+    try:
+        checkName(name)
+        checkStartAddr(startaddr)
+        if args.pack != None:
+            try:
+                dest = int(args.pack_to, 16)
+            except (TypeError, ValueError):
+                raise ValueError("need hex --pack-to.")
+            prefix = packBinary(args.pack, dest, startaddr, args.pack_mode)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    if args.watch:
+        try:
+            watch(file, name, startaddr, wav, prefix, args.map)
+        except KeyboardInterrupt:
+            exit(0)
+    try:
+        # read input file
+        with open(file, "r", encoding="utf-8") as fi:
+            content = prependLines(prefix, fi.read().split("\n"))
+        # convert begin
+        symbols = [] if args.map != None else None
+        basicBytes = encodeLines(content, startaddr, symbols=symbols)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    writeOutput(wav, name, startaddr, basicBytes)
+    if args.map != None:
+        writeMap(args.map, symbols, startaddr + len(basicBytes))
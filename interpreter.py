@@ -0,0 +1,1095 @@
+# interpreter
+# headless runner for tokenized LASER 310 BASIC, for automated tests
+# by odorajbotoj
+
+# runs the same program bytes that go to tape (see converter.encodeLines),
+# with PRINT captured to a buffer and INPUT fed from a list of lines.
+# supported: flow control, DATA/READ/RESTORE, INPUT/PRINT/PRINT USING,
+# OUT/INP, LET/DIM, CLS, operators, math and string functions, and PEEK/POKE
+# on a 64K memory image holding the program. other tokens stop the program.
+#
+# every line is lexed and split into statements once, the result is cached
+# by the line bytes and shared between runs (up to maxCachedLines), and
+# statements are dispatched through a table keyed by their leading token.
+
+import argparse
+import math
+import random
+
+import converter
+
+tokenNames = {
+    v: k for k, v in converter.allBasicDict.items() if k not in converter.specialChars
+}
+tokenNames[0x93] = "REM"
+tokenNames[0xD1] = "^"
+
+printZone = 16
+
+# compiled lines, shared between runs: line bytes -> list of statements
+# the oldest entries are dropped once it holds maxCachedLines lines
+lineCache = {}
+maxCachedLines = 4096
+
+
+class BasicError(Exception):
+    pass
+
+
+def splitItems(text):
+    # DATA items and INPUT answers: commas inside quotes do not split
+    items = []
+    item = ""
+    inQuote = False
+    for c in text + ",":
+        if c == '"':
+            inQuote = not inQuote
+        if c == "," and not inQuote:
+            item = item.strip()
+            if len(item) >= 2 and item[0] == '"' and item[-1] == '"':
+                item = item[1:-1]
+            items.append(item)
+            item = ""
+        else:
+            item += c
+    return items
+
+
+def lexLine(code):
+    # bytes of a line -> list of (kind, value)
+    # kinds: "n" number, "s" string, "v" variable name, "k" token, "p" punctuation
+    # DATA keeps its raw items as ("d", [items])
+    toks = []
+    i = 0
+    while i < len(code):
+        c = code[i]
+        if c == 0x20:
+            i += 1
+        elif c == 0x22:
+            j = i + 1
+            while j < len(code) and code[j] != 0x22:
+                j += 1
+            toks.append(("s", "".join(chr(b) for b in code[i + 1 : j])))
+            i = j + 1
+        elif 0x30 <= c <= 0x39 or c == 0x2E:
+            j = i
+            while j < len(code) and (0x30 <= code[j] <= 0x39 or code[j] == 0x2E):
+                j += 1
+            text = bytes(code[i:j]).decode("ascii")
+            # exponent, the sign after E is a token byte
+            if j < len(code) and code[j] == 0x45:
+                k = j + 1
+                sign = ""
+                if k < len(code) and code[k] in (0xCD, 0xCE):
+                    sign = "-" if code[k] == 0xCE else "+"
+                    k += 1
+                e = k
+                while e < len(code) and 0x30 <= code[e] <= 0x39:
+                    e += 1
+                if e > k:
+                    text += "E" + sign + bytes(code[k:e]).decode("ascii")
+                    j = e
+            try:
+                toks.append(("n", parseNumber(text)))
+            except ValueError:
+                raise BasicError("bad number {}".format(text))
+            i = j
+        elif 0x41 <= c <= 0x5A:
+            j = i
+            while j < len(code) and (
+                0x41 <= code[j] <= 0x5A or 0x30 <= code[j] <= 0x39
+            ):
+                j += 1
+            name = bytes(code[i:j]).decode("ascii")[:2]
+            if j < len(code) and code[j] == 0x24:
+                name += "$"
+                j += 1
+            toks.append(("v", name))
+            i = j
+        elif c == 0x93 or c == 0xFB:  # REM and ' end the line
+            break
+        elif c == 0x88:  # DATA
+            j = i + 1
+            inQuote = False
+            while j < len(code) and (inQuote or code[j] != 0x3A):
+                if code[j] == 0x22:
+                    inQuote = not inQuote
+                j += 1
+            raw = "".join(tokenNames.get(b, chr(b)) for b in code[i + 1 : j])
+            toks.append(("d", splitItems(raw)))
+            i = j
+        elif c >= 0x80:
+            toks.append(("k", c))
+            i += 1
+        else:
+            toks.append(("p", chr(c)))
+            i += 1
+    return toks
+
+
+def compileLine(code):
+    # split a line into statements. IF becomes a conditional jump inside the
+    # line: ("if", [cond, elseIndex]) skips to elseIndex when false, and the
+    # THEN part ends with ("endline", None) when an ELSE follows.
+    key = bytes(code)
+    stmts = lineCache.get(key)
+    if stmts != None:
+        return stmts
+    toks = lexLine(code)
+    stmts = []
+    pendingIfs = []
+    cur = []
+
+    def flush():
+        if len(cur) > 0:
+            if cur[0][0] == "k":
+                stmts.append((cur[0][1], cur[1:]))
+            elif cur[0][0] == "d":
+                stmts.append((0x88, cur[0][1]))
+            else:
+                stmts.append(("let", list(cur)))
+            cur.clear()
+
+    def lineJump(i):
+        # THEN 100 / ELSE 100 jump straight to a line
+        if i < len(toks) and toks[i][0] == "n":
+            stmts.append((0x8D, [toks[i]]))
+            return i + 1
+        return i
+
+    i = 0
+    while i < len(toks):
+        t = toks[i]
+        if t == ("p", ":"):
+            flush()
+            i += 1
+        elif t == ("k", 0x8F):  # IF
+            flush()
+            j = i + 1
+            while j < len(toks) and toks[j] not in (("k", 0xCA), ("k", 0x8D)):
+                j += 1
+            if j == len(toks):
+                raise BasicError("IF without THEN")
+            stmt = ("if", [toks[i + 1 : j], None])
+            stmts.append(stmt)
+            pendingIfs.append(stmt)
+            if toks[j] == ("k", 0xCA):
+                i = lineJump(j + 1)
+            else:
+                i = j
+        elif t == ("k", 0x95):  # ELSE
+            flush()
+            stmts.append(("endline", None))
+            if len(pendingIfs) > 0:
+                pendingIfs.pop()[1][1] = len(stmts)
+            i = lineJump(i + 1)
+        else:
+            cur.append(t)
+            i += 1
+    flush()
+    for stmt in pendingIfs:
+        stmt[1][1] = len(stmts)
+    if len(lineCache) >= maxCachedLines:
+        del lineCache[next(iter(lineCache))]
+    lineCache[key] = stmts
+    return stmts
+
+
+def loadProgram(basicBytes, startaddr=0x7AE9):
+    # program bytes as laid out in memory -> lines, line index and DATA items
+    program = {
+        "lines": [],
+        "index": {},
+        "data": [],
+        "start": startaddr,
+        "bytes": bytes(basicBytes),
+    }
+    p = 0
+    while p + 1 < len(basicBytes) and (basicBytes[p] or basicBytes[p + 1]):
+        lineNum = basicBytes[p + 2] | basicBytes[p + 3] << 8
+        end = p + 4
+        while basicBytes[end] != 0x00:
+            end += 1
+        try:
+            stmts = compileLine(basicBytes[p + 4 : end])
+        except BasicError as e:
+            raise BasicError("{} in {}".format(e, lineNum))
+        program["index"][lineNum] = len(program["lines"])
+        program["lines"].append((lineNum, stmts))
+        for kind, arg in stmts:
+            if kind == 0x88:
+                program["data"].extend(arg)
+        p = end + 1
+    return program
+
+
+# expressions
+
+
+def isPunct(toks, i, ch):
+    return i < len(toks) and toks[i] == ("p", ch)
+
+
+def isToken(toks, i, code):
+    return i < len(toks) and toks[i] == ("k", code)
+
+
+def expect(toks, i, ch):
+    if not isPunct(toks, i, ch):
+        raise BasicError("syntax error")
+    return i + 1
+
+
+def parseNumber(text):
+    # float() also takes INF, NAN and 1E999, the ROM does not
+    v = float(text)
+    if not math.isfinite(v):
+        raise ValueError
+    return v
+
+
+def finite(v):
+    if not math.isfinite(v):
+        raise BasicError("overflow")
+    return v
+
+
+def toNum(v):
+    if isinstance(v, str):
+        raise BasicError("type mismatch")
+    return v
+
+
+def toStr(v):
+    if not isinstance(v, str):
+        raise BasicError("type mismatch")
+    return v
+
+
+def evalExpr(vm, toks, i):
+    a, i = evalAnd(vm, toks, i)
+    while isToken(toks, i, 0xD3):  # OR
+        b, i = evalAnd(vm, toks, i + 1)
+        a = float(int(toNum(a)) | int(toNum(b)))
+    return a, i
+
+
+def evalAnd(vm, toks, i):
+    a, i = evalNot(vm, toks, i)
+    while isToken(toks, i, 0xD2):  # AND
+        b, i = evalNot(vm, toks, i + 1)
+        a = float(int(toNum(a)) & int(toNum(b)))
+    return a, i
+
+
+def evalNot(vm, toks, i):
+    if isToken(toks, i, 0xCB):  # NOT
+        a, i = evalNot(vm, toks, i + 1)
+        return float(~int(toNum(a))), i
+    return evalRel(vm, toks, i)
+
+
+relTokens = {0xD4: ">", 0xD5: "=", 0xD6: "<"}
+
+
+def evalRel(vm, toks, i):
+    a, i = evalAdd(vm, toks, i)
+    while i < len(toks) and toks[i][0] == "k" and toks[i][1] in relTokens:
+        op = ""
+        while i < len(toks) and toks[i][0] == "k" and toks[i][1] in relTokens:
+            op += relTokens[toks[i][1]]
+            i += 1
+        b, i = evalAdd(vm, toks, i)
+        if isinstance(a, str) != isinstance(b, str):
+            raise BasicError("type mismatch")
+        if op == "=":
+            r = a == b
+        elif op == "<":
+            r = a < b
+        elif op == ">":
+            r = a > b
+        elif op in ("<=", "=<"):
+            r = a <= b
+        elif op in (">=", "=>"):
+            r = a >= b
+        elif op in ("<>", "><"):
+            r = a != b
+        else:
+            raise BasicError("syntax error")
+        a = -1.0 if r else 0.0
+    return a, i
+
+
+def evalAdd(vm, toks, i):
+    a, i = evalMul(vm, toks, i)
+    while isToken(toks, i, 0xCD) or isToken(toks, i, 0xCE):
+        op = toks[i][1]
+        b, i = evalMul(vm, toks, i + 1)
+        if op == 0xCD and isinstance(a, str):
+            a = a + toStr(b)
+        elif op == 0xCD:
+            a = finite(a + toNum(b))
+        else:
+            a = finite(toNum(a) - toNum(b))
+    return a, i
+
+
+def evalMul(vm, toks, i):
+    a, i = evalUnary(vm, toks, i)
+    while isToken(toks, i, 0xCF) or isToken(toks, i, 0xD0):
+        op = toks[i][1]
+        b, i = evalUnary(vm, toks, i + 1)
+        if op == 0xCF:
+            a = finite(toNum(a) * toNum(b))
+        elif toNum(b) == 0:
+            raise BasicError("division by zero")
+        else:
+            a = finite(toNum(a) / b)
+    return a, i
+
+
+def evalUnary(vm, toks, i):
+    if isToken(toks, i, 0xCE):
+        a, i = evalUnary(vm, toks, i + 1)
+        return -toNum(a), i
+    if isToken(toks, i, 0xCD):
+        return evalUnary(vm, toks, i + 1)
+    return evalPow(vm, toks, i)
+
+
+def evalPow(vm, toks, i):
+    a, i = evalAtom(vm, toks, i)
+    while isToken(toks, i, 0xD1):
+        j = i + 1
+        sign = 1
+        while isToken(toks, j, 0xCE) or isToken(toks, j, 0xCD):
+            if toks[j][1] == 0xCE:
+                sign = -sign
+            j += 1
+        b, i = evalAtom(vm, toks, j)
+        try:
+            a = toNum(a) ** (sign * toNum(b))
+        except (ZeroDivisionError, OverflowError):
+            raise BasicError("illegal function call")
+        if isinstance(a, complex):
+            raise BasicError("illegal function call")
+    return a, i
+
+
+def evalArgs(vm, toks, i):
+    # "(a, b, ...)" -> list of values
+    i = expect(toks, i, "(")
+    args = []
+    while True:
+        v, i = evalExpr(vm, toks, i)
+        args.append(v)
+        if isPunct(toks, i, ","):
+            i += 1
+            continue
+        return args, expect(toks, i, ")")
+
+
+def evalAtom(vm, toks, i):
+    if i >= len(toks):
+        raise BasicError("syntax error")
+    kind, value = toks[i]
+    if kind == "n" or kind == "s":
+        return value, i + 1
+    if kind == "v":
+        if isPunct(toks, i + 1, "("):
+            args, j = evalArgs(vm, toks, i + 1)
+            return getArray(vm, value, args), j
+        return getVar(vm, value), i + 1
+    if kind == "p" and value == "(":
+        v, i = evalExpr(vm, toks, i + 1)
+        return v, expect(toks, i, ")")
+    if kind == "k" and value == 0xC9:  # INKEY$
+        if len(vm["keys"]) > 0:
+            return vm["keys"].pop(0), i + 1
+        return "", i + 1
+    if kind == "k" and value in functions:
+        args, j = evalArgs(vm, toks, i + 1)
+        try:
+            return functions[value](vm, *args), j
+        except TypeError:
+            raise BasicError("syntax error")
+        except (ValueError, OverflowError):
+            raise BasicError("illegal function call")
+    raise BasicError("syntax error")
+
+
+def basicRND(vm, x):
+    x = int(toNum(x))
+    if x == 0:
+        return vm["random"].random()
+    if x < 0:
+        raise ValueError
+    return float(vm["random"].randint(1, x))
+
+
+def basicVAL(vm, s):
+    s = toStr(s).strip()
+    for j in range(len(s), 0, -1):
+        try:
+            v = float(s[:j])
+        except ValueError:
+            continue
+        # INF and NAN are words to the ROM, not numbers
+        if s[:j].lstrip("+-").upper().startswith(("INF", "NAN")):
+            continue
+        return finite(v)
+    return 0.0
+
+
+def basicMID(vm, s, start, n=None):
+    start = int(toNum(start))
+    if start < 1:
+        raise ValueError
+    if n == None:
+        return toStr(s)[start - 1 :]
+    n = int(toNum(n))
+    if n < 0:
+        raise ValueError
+    return toStr(s)[start - 1 : start - 1 + n]
+
+
+def basicLEFT(vm, s, n):
+    n = int(toNum(n))
+    if n < 0:
+        raise ValueError
+    return toStr(s)[:n]
+
+
+def basicRIGHT(vm, s, n):
+    n = int(toNum(n))
+    if n < 1:
+        return ""
+    return toStr(s)[-n:]
+
+
+def basicASC(vm, s):
+    s = toStr(s)
+    if s == "":
+        raise ValueError
+    return float(ord(s[0]))
+
+
+def basicCHR(vm, x):
+    x = int(toNum(x))
+    if x < 0 or x > 255:
+        raise ValueError
+    return chr(x)
+
+
+def basicLOG(vm, x):
+    if toNum(x) <= 0:
+        raise ValueError
+    return math.log(x)
+
+
+functions = {
+    0xD7: lambda vm, x: float((toNum(x) > 0) - (toNum(x) < 0)),  # SGN
+    0xD8: lambda vm, x: float(math.floor(toNum(x))),  # INT
+    0xD9: lambda vm, x: abs(toNum(x)),  # ABS
+    0xDD: lambda vm, x: math.sqrt(toNum(x)),  # SQR
+    0xDE: basicRND,  # RND
+    0xDF: basicLOG,  # LOG
+    0xE0: lambda vm, x: math.exp(toNum(x)),  # EXP
+    0xE1: lambda vm, x: math.cos(toNum(x)),  # COS
+    0xE2: lambda vm, x: math.sin(toNum(x)),  # SIN
+    0xE3: lambda vm, x: math.tan(toNum(x)),  # TAN
+    0xE4: lambda vm, x: math.atan(toNum(x)),  # ATN
+    0xDB: lambda vm, p: float(vm["ports"].get(int(toNum(p)), 0)),  # INP
+    0xE5: lambda vm, a: float(vm["memory"][address(a)]),  # PEEK
+    0xF3: lambda vm, s: float(len(toStr(s))),  # LEN
+    0xF4: lambda vm, x: formatNumber(toNum(x)),  # STR$
+    0xF5: basicVAL,  # VAL
+    0xF6: basicASC,  # ASC
+    0xF7: basicCHR,  # CHR$
+    0xF8: basicLEFT,  # LEFT$
+    0xF9: basicRIGHT,  # RIGHT$
+    0xFA: basicMID,  # MID$
+}
+
+
+def formatNumber(v):
+    # positive numbers get a leading space, like the ROM does
+    if v == int(v) and abs(v) < 1e9:
+        s = str(int(v))
+    else:
+        s = "{:.6G}".format(v)
+        if s.startswith(("0.", "-0.")):
+            s = s.replace("0.", ".", 1)
+    if v >= 0:
+        s = " " + s
+    return s
+
+
+# variables
+
+
+def getVar(vm, name):
+    v = vm["vars"].get(name)
+    if v == None:
+        return "" if name.endswith("$") else 0.0
+    return v
+
+
+def checkType(name, value):
+    if name.endswith("$") != isinstance(value, str):
+        raise BasicError("type mismatch")
+
+
+def arraySlot(vm, name, args):
+    arr = vm["arrays"].get(name)
+    if arr == None:
+        arr = dimArray(vm, name, [10] * len(args))
+    index = tuple(int(toNum(a)) for a in args)
+    if len(index) != len(arr["dims"]):
+        raise BasicError("bad subscript")
+    for k, dim in zip(index, arr["dims"]):
+        if k < 0 or k > dim:
+            raise BasicError("bad subscript")
+    return arr, index
+
+
+def getArray(vm, name, args):
+    arr, index = arraySlot(vm, name, args)
+    return arr["data"].get(index, "" if name.endswith("$") else 0.0)
+
+
+def dimArray(vm, name, dims):
+    if name in vm["arrays"]:
+        raise BasicError("redimensioned array")
+    arr = {"dims": tuple(dims), "data": {}}
+    vm["arrays"][name] = arr
+    return arr
+
+
+def parseTarget(vm, toks, i):
+    # variable or array element -> (name, index or None, next i)
+    if i >= len(toks) or toks[i][0] != "v":
+        raise BasicError("syntax error")
+    name = toks[i][1]
+    if isPunct(toks, i + 1, "("):
+        args, i = evalArgs(vm, toks, i + 1)
+        return name, args, i
+    return name, None, i + 1
+
+
+def assign(vm, name, args, value):
+    checkType(name, value)
+    if args == None:
+        vm["vars"][name] = value
+    else:
+        arr, index = arraySlot(vm, name, args)
+        arr["data"][index] = value
+
+
+# statements
+
+
+def out(vm, text):
+    vm["output"].append(text)
+    if "\n" in text:
+        vm["column"] = len(text) - text.rindex("\n") - 1
+    else:
+        vm["column"] += len(text)
+
+
+def lineTarget(toks):
+    if len(toks) != 1 or toks[0][0] != "n":
+        raise BasicError("syntax error")
+    return int(toks[0][1])
+
+
+def jump(vm, lineNum):
+    index = vm["program"]["index"].get(lineNum)
+    if index == None:
+        raise BasicError("undefined line {}".format(lineNum))
+    vm["pc"] = (index, 0)
+
+
+def doEnd(vm, toks):
+    vm["running"] = False
+
+
+def doStop(vm, toks):
+    out(vm, "BREAK IN {}\n".format(vm["lineNum"]))
+    vm["running"] = False
+
+
+def doNothing(vm, toks):
+    pass
+
+
+def doGoto(vm, toks):
+    jump(vm, lineTarget(toks))
+
+
+def doGosub(vm, toks):
+    vm["stack"].append(("gosub", vm["pc"]))
+    jump(vm, lineTarget(toks))
+
+
+def doReturn(vm, toks):
+    # drop FOR frames opened inside the subroutine
+    while len(vm["stack"]) > 0 and vm["stack"][-1][0] != "gosub":
+        vm["stack"].pop()
+    if len(vm["stack"]) == 0:
+        raise BasicError("RETURN without GOSUB")
+    vm["pc"] = vm["stack"].pop()[1]
+
+
+def doIf(vm, arg):
+    cond, elseIndex = arg
+    v, i = evalExpr(vm, cond, 0)
+    if i != len(cond):
+        raise BasicError("syntax error")
+    if toNum(v) == 0:
+        vm["pc"] = (vm["pc"][0], elseIndex)
+
+
+def doEndLine(vm, arg):
+    vm["pc"] = (vm["pc"][0] + 1, 0)
+
+
+def doFor(vm, toks):
+    if len(toks) < 2 or toks[0][0] != "v" or toks[1] != ("k", 0xD5):
+        raise BasicError("syntax error")
+    name = toks[0][1]
+    start, i = evalExpr(vm, toks, 2)
+    if not isToken(toks, i, 0xBD):  # TO
+        raise BasicError("syntax error")
+    limit, i = evalExpr(vm, toks, i + 1)
+    step = 1.0
+    if isToken(toks, i, 0xCC):  # STEP
+        step, i = evalExpr(vm, toks, i + 1)
+    assign(vm, name, None, toNum(start))
+    # a new FOR on the same variable replaces the old loop
+    stack = vm["stack"]
+    for k in range(len(stack) - 1, -1, -1):
+        if stack[k][0] == "gosub":
+            break
+        if stack[k][1] == name:
+            del stack[k:]
+            break
+    stack.append(("for", name, toNum(limit), toNum(step), vm["pc"]))
+
+
+def doNext(vm, toks):
+    names = [t[1] for t in toks if t[0] == "v"] or [None]
+    for name in names:
+        stack = vm["stack"]
+        while True:
+            if len(stack) == 0 or stack[-1][0] != "for":
+                raise BasicError("NEXT without FOR")
+            if name == None or stack[-1][1] == name:
+                break
+            stack.pop()
+        kind, var, limit, step, pc = stack[-1]
+        v = getVar(vm, var) + step
+        vm["vars"][var] = v
+        if (step >= 0 and v <= limit) or (step < 0 and v >= limit):
+            vm["pc"] = pc
+            return
+        stack.pop()
+
+
+def doLet(vm, toks):
+    name, args, i = parseTarget(vm, toks, 0)
+    if not isToken(toks, i, 0xD5):
+        raise BasicError("syntax error")
+    v, i = evalExpr(vm, toks, i + 1)
+    if i != len(toks):
+        raise BasicError("syntax error")
+    assign(vm, name, args, v)
+
+
+def doDim(vm, toks):
+    i = 0
+    while i < len(toks):
+        if toks[i][0] != "v":
+            raise BasicError("syntax error")
+        name = toks[i][1]
+        args, i = evalArgs(vm, toks, i + 1)
+        dimArray(vm, name, [int(toNum(a)) for a in args])
+        if isPunct(toks, i, ","):
+            i += 1
+        elif i != len(toks):
+            raise BasicError("syntax error")
+
+
+def numberField(fmt, p):
+    # a numeric PRINT USING field at p -> (field, end), or (None, p)
+    # no ^^^^ fields, ^ cannot be typed inside a string on the machine
+    f = {"kind": "n", "plus": False, "fill": " ", "dollar": False, "comma": False}
+    f.update({"int": 0, "frac": -1, "trail": ""})
+    q = p
+    if fmt.startswith("+", q):
+        f["plus"] = True
+        q += 1
+    if fmt.startswith("**", q):
+        f["fill"] = "*"
+        f["int"] += 2
+        q += 2
+        if fmt.startswith("$", q):
+            f["dollar"] = True
+            f["int"] += 1
+            q += 1
+    elif fmt.startswith("$$", q):
+        f["dollar"] = True
+        f["int"] += 2
+        q += 2
+    while q < len(fmt) and (fmt[q] == "#" or (fmt[q] == "," and f["int"] > 0)):
+        if fmt[q] == ",":
+            f["comma"] = True
+        f["int"] += 1
+        q += 1
+    if fmt.startswith(".", q) and (f["int"] > 0 or fmt.startswith(".#", q)):
+        f["frac"] = 0
+        q += 1
+        while fmt.startswith("#", q):
+            f["frac"] += 1
+            q += 1
+    if f["int"] == 0 and f["frac"] <= 0:
+        return None, p
+    if q < len(fmt) and fmt[q] in "+-" and not f["plus"]:
+        f["trail"] = fmt[q]
+        q += 1
+    return f, q
+
+
+def usingFields(fmt):
+    # PRINT USING format -> list of literal strings and field dicts
+    parts = []
+    lit = ""
+    p = 0
+    while p < len(fmt):
+        c = fmt[p]
+        q = fmt.find("%", p + 1)
+        if c == "!":
+            field = {"kind": "s", "width": 1}
+            p += 1
+        elif c == "%" and q > 0 and fmt[p + 1 : q].strip() == "":
+            field = {"kind": "s", "width": q - p + 1}
+            p = q + 1
+        else:
+            field, p = numberField(fmt, p)
+            if field == None:
+                lit += c
+                p += 1
+                continue
+        if lit != "":
+            parts.append(lit)
+            lit = ""
+        parts.append(field)
+    if lit != "":
+        parts.append(lit)
+    return parts
+
+
+def usingNumber(v, f):
+    neg = v < 0
+    v = abs(v)
+    frac = max(f["frac"], 0)
+    width = f["int"] + f["frac"] + 1 + (1 if f["plus"] else 0)
+    body = "{:.{}f}".format(v, frac)
+    if f["comma"]:
+        head, dot, tail = body.partition(".")
+        body = "{:,}".format(int(head)) + dot + tail
+    if f["frac"] == 0:
+        body += "."
+    if f["dollar"]:
+        body = "$" + body
+    if f["plus"]:
+        body = ("-" if neg else "+") + body
+    elif neg and f["trail"] == "":
+        body = "-" + body
+    trail = ""
+    if f["trail"] == "+":
+        trail = "-" if neg else "+"
+    elif f["trail"] == "-":
+        trail = "-" if neg else " "
+    # drop the 0 of 0.5 when the field has no room for it
+    if len(body) > width and "0." in body[:3]:
+        body = body.replace("0.", ".", 1)
+    if len(body) > width:
+        return "%" + body + trail
+    return body.rjust(width, f["fill"]) + trail
+
+
+def printUsing(vm, toks, i, fmt):
+    # the format is used again from the start while values are left
+    # returns whether the line ends with a newline
+    parts = usingFields(fmt)
+    if not any(isinstance(p, dict) for p in parts):
+        raise BasicError("illegal function call")
+    text = ""
+    newline = True
+    k = 0
+    while i < len(toks):
+        v, i = evalExpr(vm, toks, i)
+        while True:
+            if k == len(parts):
+                k = 0
+            if isinstance(parts[k], dict):
+                break
+            text += parts[k]
+            k += 1
+        field = parts[k]
+        k += 1
+        if field["kind"] == "s":
+            text += toStr(v)[: field["width"]].ljust(field["width"])
+        else:
+            text += usingNumber(toNum(v), field)
+        newline = True
+        if isPunct(toks, i, ";") or isPunct(toks, i, ","):
+            newline = False
+            i += 1
+        elif i != len(toks):
+            raise BasicError("syntax error")
+    while k < len(parts) and not isinstance(parts[k], dict):
+        text += parts[k]
+        k += 1
+    out(vm, text)
+    return newline
+
+
+def doPrint(vm, toks):
+    i = 0
+    newline = True
+    while i < len(toks):
+        newline = True
+        if isPunct(toks, i, ";"):
+            newline = False
+            i += 1
+        elif isPunct(toks, i, ","):
+            out(vm, " " * (printZone - vm["column"] % printZone))
+            newline = False
+            i += 1
+        elif isToken(toks, i, 0xBC):  # TAB(
+            v, i = evalExpr(vm, toks, i + 1)
+            i = expect(toks, i, ")")
+            col = int(toNum(v))
+            if col > vm["column"]:
+                out(vm, " " * (col - vm["column"]))
+            newline = False
+        elif isToken(toks, i, 0xBF):  # USING
+            fmt, i = evalExpr(vm, toks, i + 1)
+            if not isPunct(toks, i, ";"):
+                raise BasicError("syntax error")
+            newline = printUsing(vm, toks, i + 1, toStr(fmt))
+            break
+        else:
+            v, i = evalExpr(vm, toks, i)
+            if isinstance(v, str):
+                out(vm, v)
+            else:
+                out(vm, formatNumber(v) + " ")
+    if newline:
+        out(vm, "\n")
+
+
+def doInput(vm, toks):
+    i = 0
+    prompt = ""
+    if i < len(toks) and toks[i][0] == "s":
+        prompt = toks[i][1]
+        i += 1
+        if not isPunct(toks, i, ";"):
+            raise BasicError("syntax error")
+        i += 1
+    targets = []
+    while i < len(toks):
+        name, args, i = parseTarget(vm, toks, i)
+        targets.append((name, args))
+        if isPunct(toks, i, ","):
+            i += 1
+        elif i != len(toks):
+            raise BasicError("syntax error")
+    values = []
+    out(vm, prompt + "? ")
+    while len(values) < len(targets):
+        if len(vm["inputs"]) == 0:
+            raise BasicError("out of input")
+        line = vm["inputs"].pop(0)
+        out(vm, line + "\n")
+        values.extend(splitItems(line))
+        if len(values) < len(targets):
+            out(vm, "?? ")
+    for (name, args), value in zip(targets, values):
+        if name.endswith("$"):
+            assign(vm, name, args, value)
+        else:
+            try:
+                assign(vm, name, args, parseNumber(value))
+            except ValueError:
+                raise BasicError("bad number input {}".format(value))
+
+
+def doRead(vm, toks):
+    i = 0
+    while i < len(toks):
+        name, args, i = parseTarget(vm, toks, i)
+        data = vm["program"]["data"]
+        if vm["dataPtr"] >= len(data):
+            raise BasicError("out of data")
+        item = data[vm["dataPtr"]]
+        vm["dataPtr"] += 1
+        if name.endswith("$"):
+            assign(vm, name, args, item)
+        else:
+            try:
+                assign(vm, name, args, parseNumber(item))
+            except ValueError:
+                raise BasicError("syntax error in DATA")
+        if isPunct(toks, i, ","):
+            i += 1
+        elif i != len(toks):
+            raise BasicError("syntax error")
+
+
+def doRestore(vm, toks):
+    vm["dataPtr"] = 0
+
+
+def address(a):
+    # PEEK and POKE take -32768..65535, negative counts down from 0xFFFF
+    a = int(toNum(a))
+    if a < -32768 or a > 65535:
+        raise ValueError
+    return a & 0xFFFF
+
+
+def doPoke(vm, toks):
+    addr, i = evalExpr(vm, toks, 0)
+    i = expect(toks, i, ",")
+    value, i = evalExpr(vm, toks, i)
+    try:
+        vm["memory"][address(addr)] = int(toNum(value))
+    except ValueError:
+        raise BasicError("illegal function call")
+
+
+def doOut(vm, toks):
+    port, i = evalExpr(vm, toks, 0)
+    i = expect(toks, i, ",")
+    value, i = evalExpr(vm, toks, i)
+    vm["ports"][int(toNum(port))] = int(toNum(value)) & 0xFF
+
+
+statements = {
+    0x80: doEnd,  # END
+    0x81: doFor,  # FOR
+    0x87: doNext,  # NEXT
+    0x8D: doGoto,  # GOTO
+    0x91: doGosub,  # GOSUB
+    0x92: doReturn,  # RETURN
+    0x94: doStop,  # STOP
+    0x88: doNothing,  # DATA
+    0x89: doInput,  # INPUT
+    0x8B: doRead,  # READ
+    0x90: doRestore,  # RESTORE
+    0xA0: doOut,  # OUT
+    0xB2: doPrint,  # PRINT
+    0x8A: doDim,  # DIM
+    0x8C: doLet,  # LET
+    0x84: doNothing,  # CLS
+    0xB1: doPoke,  # POKE
+    "let": doLet,
+    "if": doIf,
+    "endline": doEndLine,
+}
+
+
+def runProgram(program, inputs=(), keys=(), seed=0, maxSteps=1000000):
+    # returns {"output", "hits", "steps", "memory"}
+    # raises BasicError with the line number
+    start = program["start"]
+    memory = bytearray(0x10000)
+    memory[start : start + len(program["bytes"])] = program["bytes"]
+    vm = {
+        "program": program,
+        "vars": {},
+        "arrays": {},
+        "stack": [],
+        "ports": {},
+        "inputs": list(inputs),
+        "keys": list(keys),
+        "random": random.Random(seed),
+        "dataPtr": 0,
+        "output": [],
+        "column": 0,
+        "hits": {},
+        "pc": (0, 0),
+        "lineNum": None,
+        "running": True,
+        "memory": memory,
+    }
+    lines = program["lines"]
+    hits = vm["hits"]
+    steps = 0
+    while vm["running"]:
+        li, si = vm["pc"]
+        if li >= len(lines):
+            break
+        lineNum, stmts = lines[li]
+        if si >= len(stmts):
+            vm["pc"] = (li + 1, 0)
+            continue
+        if si == 0:
+            hits[lineNum] = hits.get(lineNum, 0) + 1
+        vm["lineNum"] = lineNum
+        steps += 1
+        if steps > maxSteps:
+            raise BasicError("step limit reached in {}".format(lineNum))
+        kind, arg = stmts[si]
+        vm["pc"] = (li, si + 1)
+        handler = statements.get(kind)
+        if handler == None:
+            raise BasicError(
+                "unsupported {} in {}".format(tokenNames.get(kind, kind), lineNum)
+            )
+        try:
+            handler(vm, arg)
+        except BasicError as e:
+            raise BasicError("{} in {}".format(e, lineNum))
+    return {
+        "output": "".join(vm["output"]),
+        "hits": hits,
+        "steps": steps,
+        "memory": memory,
+    }
+
+
+def runText(content, inputs=(), keys=(), seed=0, maxSteps=1000000):
+    # convenience for listings in converter.py format
+    program = loadProgram(converter.encodeLines(content, 0x7AE9))
+    return runProgram(program, inputs, keys, seed, maxSteps)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", help="listing in converter.py format")
+    parser.add_argument("--input", help="file with one INPUT answer per line")
+    parser.add_argument("--max-steps", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0, help="seed for RND")
+    parser.add_argument("--profile", help="write line hit counts for optimizer.py")
+    args = parser.parse_args()
+    inputs = []
+    if args.input != None:
+        with open(args.input, "r", encoding="utf-8") as f:
+            inputs = f.read().splitlines()
+    with open(args.file, "r", encoding="utf-8") as f:
+        content = f.read().split("\n")
+    try:
+        result = runText(content, inputs, seed=args.seed, maxSteps=args.max_steps)
+    except (ValueError, BasicError) as e:
+        print(e)
+        exit(1)
+    print(result["output"], end="")
+    if args.profile != None:
+        with open(args.profile, "w", encoding="utf-8") as f:
+            for lineNum, count in sorted(result["hits"].items()):
+                f.write("{} {}\n".format(lineNum, count))
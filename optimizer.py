@@ -0,0 +1,219 @@
+# optimizer
+# moves hot subroutines and jump targets toward the start of a listing
+# by odorajbotoj
+
+# the ROM finds the line of a GOTO/GOSUB by walking the line list from the
+# start of the program, so a jump to the n-th line costs n steps.
+#
+# a block is a run of lines that starts at a jump target and ends at the
+# first line whose last statement is GOTO, RETURN, END or STOP, and whose
+# previous line also ends that way. no line falls into or out of such a
+# block, so it can sit anywhere. hot blocks are moved right behind a
+# "GOTO <first line>" stub, then every line is renumbered and the jump
+# targets are rewritten.
+#
+# heat is the number of jump sites into a block, or, with a profile from
+# interpreter.py --profile, how often those sites were run.
+
+import argparse
+import re
+
+jumpPattern = re.compile(r"(GOTO|GOSUB|THEN|ELSE)(\s*)(\d+)")
+maxLineLen = 60
+
+
+def parseListing(content):
+    # -> list of [lineNum, body], same line rules as converter.tokenizeLine
+    lines = []
+    for line in content:
+        lineSplit = line.strip().split(" ", 1)
+        if len(lineSplit) != 2:
+            continue
+        try:
+            lineNum = int(lineSplit[0])
+        except ValueError:
+            raise ValueError("invalid line number {}.".format(lineSplit[0]))
+        lines.append([lineNum, lineSplit[1].strip()])
+    return lines
+
+
+def codeParts(body):
+    # parts outside of quotes, REM lines have none
+    if body.startswith("REM "):
+        return []
+    return body.split('"')[::2]
+
+
+def jumpTargets(body):
+    targets = []
+    for part in codeParts(body):
+        for m in jumpPattern.finditer(part):
+            targets.append(int(m.group(3)))
+    return targets
+
+
+def endsUnconditionally(body):
+    code = "".join(codeParts(body))
+    if code == "" or "IF" in code:
+        return False
+    last = code.split(":")[-1].strip()
+    return last.startswith(("GOTO", "RETURN", "END", "STOP"))
+
+
+def findBlocks(lines, targets):
+    blocks = []
+    s = 1
+    while s < len(lines):
+        if lines[s][0] in targets and endsUnconditionally(lines[s - 1][1]):
+            e = s
+            while e < len(lines) and not endsUnconditionally(lines[e][1]):
+                e += 1
+            if e == len(lines):
+                break
+            block = lines[s : e + 1]
+            # moving DATA would change what READ returns
+            if not any("DATA" in "".join(codeParts(body)) for n, body in block):
+                blocks.append((s, e))
+            s = e + 1
+        else:
+            s += 1
+    return blocks
+
+
+def jumpSites(lines, profile):
+    # -> list of (target lineNum, weight)
+    sites = []
+    for lineNum, body in lines:
+        weight = 1 if profile == None else profile.get(lineNum, 0)
+        for t in jumpTargets(body):
+            sites.append((t, weight))
+    return sites
+
+
+def layoutCost(order, sites):
+    # total line-walk steps; order is the list of old line numbers
+    position = {lineNum: i for i, lineNum in enumerate(order)}
+    return sum(position.get(t, 0) * w for t, w in sites)
+
+
+def optimize(lines, profile=None, start=10, step=10):
+    # returns (new lines, report lines)
+    nums = [lineNum for lineNum, body in lines]
+    sites = jumpSites(lines, profile)
+    # renumbering could give a missing target the number of a real line
+    missing = sorted(set(t for t, w in sites) - set(nums))
+    if len(missing) > 0:
+        raise ValueError("jump to missing line {}.".format(missing[0]))
+    blocks = findBlocks(lines, set(t for t, w in sites))
+    heat = {}
+    for s, e in blocks:
+        inside = set(nums[s : e + 1])
+        heat[(s, e)] = sum(w for t, w in sites if t in inside)
+    # the stub is None in the order, it jumps to the old first line
+    moved = []
+
+    def order(moved):
+        front = [None]
+        for s, e in moved:
+            front.extend(nums[s : e + 1])
+        inFront = set(front)
+        return front + [n for n in nums if n not in inFront]
+
+    before = layoutCost(nums, sites)
+    best = before
+    for block in sorted(blocks, key=lambda b: -heat[b]):
+        if heat[block] == 0:
+            break
+        cost = layoutCost(order(moved + [block]), sites)
+        if cost < best:
+            moved.append(block)
+            best = cost
+    report = []
+    if len(moved) == 0:
+        report.append("nothing to move, {} line-walk steps.".format(before))
+        return [list(line) for line in lines], report
+    newOrder = order(moved)
+    bodies = dict((lineNum, body) for lineNum, body in lines)
+    renumber = {}
+    for i, lineNum in enumerate(newOrder):
+        renumber[lineNum] = start + i * step
+    if start + (len(newOrder) - 1) * step > 65529:
+        raise ValueError("line number > 65529 after renumbering.")
+
+    def rewrite(body):
+        if body.startswith("REM "):
+            return body
+        parts = body.split('"')
+        for i in range(0, len(parts), 2):
+            parts[i] = jumpPattern.sub(
+                lambda m: m.group(1)
+                + m.group(2)
+                + str(renumber.get(int(m.group(3)), int(m.group(3)))),
+                parts[i],
+            )
+        return '"'.join(parts)
+
+    newLines = []
+    for lineNum in newOrder:
+        if lineNum == None:
+            newLines.append([renumber[None], "GOTO {}".format(renumber[nums[0]])])
+        else:
+            newLines.append([renumber[lineNum], rewrite(bodies[lineNum])])
+    oldPos = {lineNum: i for i, lineNum in enumerate(nums)}
+    newPos = {lineNum: i for i, lineNum in enumerate(newOrder)}
+    for s, e in moved:
+        first = nums[s]
+        report.append(
+            "lines {}-{} -> {}-{}: heat {}, steps per call {} -> {}, saved {}".format(
+                nums[s],
+                nums[e],
+                renumber[nums[s]],
+                renumber[nums[e]],
+                heat[(s, e)],
+                oldPos[first],
+                newPos[first],
+                oldPos[first] - newPos[first],
+            )
+        )
+    report.append("line-walk steps {} -> {}".format(before, best))
+    for lineNum, body in newLines:
+        text = "{} {}".format(lineNum, body)
+        if len(text) > maxLineLen:
+            report.append("warning: line {} longer than 60 chars.".format(lineNum))
+    return newLines, report
+
+
+def readProfile(filename):
+    # "lineNum count" per line, as written by interpreter.py --profile
+    profile = {}
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) == 2:
+                profile[int(fields[0])] = int(fields[1])
+    return profile
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("file", help="listing in converter.py format")
+    parser.add_argument("out", help="optimized listing")
+    parser.add_argument("--profile", help="line hit counts from interpreter.py")
+    parser.add_argument("--start", type=int, default=10)
+    parser.add_argument("--step", type=int, default=10)
+    args = parser.parse_args()
+    profile = None
+    if args.profile != None:
+        profile = readProfile(args.profile)
+    try:
+        with open(args.file, "r", encoding="utf-8") as f:
+            lines = parseListing(f.read().split("\n"))
+        newLines, report = optimize(lines, profile, args.start, args.step)
+    except ValueError as e:
+        print(e)
+        exit(1)
+    with open(args.out, "w", encoding="utf-8") as f:
+        for lineNum, body in newLines:
+            f.write("{} {}\n".format(lineNum, body))
+    for line in report:
+        print(line)
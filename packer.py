@@ -0,0 +1,201 @@
+# packer
+# packs a binary file (sprites, machine code) into BASIC lines with a loader
+# by odorajbotoj
+
+# two layouts:
+#   data: dense DATA lines and a READ/POKE loop
+#   rem:  the bytes as hex in REM lines at the very start of the program,
+#         and a loop that PEEKs them out of program memory. the REM lines
+#         must be the first lines, their address follows from the start
+#         address of the program.
+#
+# lines are returned as (lineNum, parts). keywords are parts of their own,
+# so the same lines work as converter.py text ("".join(parts)) and as
+# BASICEditor.py blocks.
+#
+# addresses above 32767 are written as negative numbers, as PEEK and POKE
+# take a signed 16 bit value.
+
+import argparse
+
+keywords = [
+    "FOR",
+    "TO",
+    "NEXT",
+    "READ",
+    "POKE",
+    "PEEK",
+    "DATA",
+    "REM",
+    "IF",
+    "THEN",
+    "+",
+    "-",
+    "*",
+    ">",
+    "=",
+]
+maxLineLen = 60
+# every byte on tape is 8 bits of 36 samples at 22050 Hz
+tapeByteTime = 8 * 36 / 22050
+# rough average time of one simple BASIC statement on the machine
+statementTime = 0.004
+# statements run per unpacked byte by each loader
+dataStatements = 5
+remStatements = 13
+
+
+def splitParts(text):
+    parts = []
+    raw = ""
+    i = 0
+    while i < len(text):
+        for k in keywords:
+            if text.startswith(k, i):
+                if raw != "":
+                    parts.append(raw)
+                    raw = ""
+                parts.append(k)
+                i += len(k)
+                break
+        else:
+            raw += text[i]
+            i += 1
+    if raw != "":
+        parts.append(raw)
+    return parts
+
+
+def signed(addr):
+    if addr > 32767:
+        return addr - 65536
+    return addr
+
+
+def wrap(v):
+    # keep an address variable in the signed range
+    return "IF {0}>32767 THEN {0}={0}-65536".format(v)
+
+
+def checkDest(data, dest):
+    if len(data) == 0:
+        raise ValueError("empty binary.")
+    if dest < 0 or dest + len(data) > 0x10000:
+        raise ValueError("binary does not fit below 0xFFFF.")
+
+
+def lineBytes(parts):
+    # next-line pointer, line number, code and the trailing 0x00
+    return 5 + sum(1 if p in keywords else len(p) for p in parts)
+
+
+def packData(data, dest, firstLine=0, step=1):
+    checkDest(data, dest)
+    lineNum = firstLine
+    lines = []
+    for text in [
+        "D={}:FOR I=1 TO {}:READ A:POKE D,A:D=D+1".format(signed(dest), len(data)),
+        wrap("D"),
+        "NEXT",
+    ]:
+        lines.append((lineNum, splitParts(text)))
+        lineNum += step
+    items = []
+    for b in data:
+        text = "DATA " + ",".join(items + [str(b)])
+        if len(items) > 0 and len("{} {}".format(lineNum, text)) > maxLineLen:
+            lines.append((lineNum, ["DATA", " " + ",".join(items)]))
+            lineNum += step
+            items = []
+        items.append(str(b))
+    lines.append((lineNum, ["DATA", " " + ",".join(items)]))
+    return lines
+
+
+def packREM(data, dest, startaddr, firstLine=0, step=1):
+    checkDest(data, dest)
+    payload = data.hex().upper()
+    # hex chars per REM line, even, limited by the widest line number
+    count = 1
+    while True:
+        lastNum = firstLine + step * (count - 1)
+        width = (maxLineLen - len("{} REM ".format(lastNum))) // 2 * 2
+        need = -(-len(payload) // width)
+        if need <= count:
+            break
+        count = need
+    lines = []
+    lineNum = firstLine
+    for i in range(0, len(payload), width):
+        lines.append((lineNum, ["REM", " " + payload[i : i + width]]))
+        lineNum += step
+    # first hex char sits after pointer, line number, REM token and a space
+    first = startaddr + 6
+    for text in [
+        "P={}:D={}:C=0:FOR I=1 TO {}".format(signed(first), signed(dest), len(data)),
+        "A=PEEK(P)-48:P=P+1:" + wrap("P"),
+        "B=PEEK(P)-48:P=P+1:" + wrap("P"),
+        "POKE D,16*(A+7*(A>9))+B+7*(B>9):D=D+1",
+        wrap("D"),
+        # skip 0x00, pointer, line number, REM and space of the next line
+        "C=C+2:IF C={} THEN P=P+7:C=0".format(width),
+        wrap("P"),
+        "NEXT",
+    ]:
+        lines.append((lineNum, splitParts(text)))
+        lineNum += step
+    return lines
+
+
+def report(lines, size, perByte):
+    tapeBytes = sum(lineBytes(parts) for lineNum, parts in lines)
+    return {
+        "lines": len(lines),
+        "tapeBytes": tapeBytes,
+        "loadTime": tapeBytes * tapeByteTime,
+        "unpackTime": size * perByte * statementTime,
+    }
+
+
+def pack(data, dest, startaddr, mode, firstLine=0, step=1):
+    # -> (lines, report)
+    if mode == "rem":
+        lines = packREM(data, dest, startaddr, firstLine, step)
+        return lines, report(lines, len(data), remStatements)
+    lines = packData(data, dest, firstLine, step)
+    return lines, report(lines, len(data), dataStatements)
+
+
+def formatReport(mode, r):
+    return "{}: {} lines, {} tape bytes, load ~{:.1f} s, unpack ~{:.1f} s".format(
+        mode, r["lines"], r["tapeBytes"], r["loadTime"], r["unpackTime"]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("bin", help="binary file to pack")
+    parser.add_argument("dest", help="hex address to unpack to")
+    parser.add_argument("--mode", choices=["data", "rem"], default="data")
+    parser.add_argument("--start", default="7AE9", help="hex start of the program")
+    parser.add_argument("--first", type=int, default=0, help="first line number")
+    parser.add_argument("--step", type=int, default=1, help="line number step")
+    parser.add_argument("-o", "--output", help="write the lines here")
+    args = parser.parse_args()
+    with open(args.bin, "rb") as f:
+        data = f.read()
+    try:
+        dest = int(args.dest, 16)
+        startaddr = int(args.start, 16)
+        for mode in ("data", "rem"):
+            lines, r = pack(data, dest, startaddr, mode, args.first, args.step)
+            print(formatReport(mode, r))
+            if mode == args.mode:
+                chosen = lines
+    except ValueError as e:
+        print(e)
+        exit(1)
+    if args.output != None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for lineNum, parts in chosen:
+                f.write("{} {}\n".format(lineNum, "".join(parts)))
@@ -0,0 +1,240 @@
+# server
+# long-lived local conversion service on top of converter.py
+# by odorajbotoj
+
+# POST /convert?name=NAME&addr=7AE9&format=wav   body: listing text (utf-8)
+#   -> 200 with the WAV or VZ bytes, 400 on bad input, 503 when the queue is full
+# GET /stats
+#   -> JSON throughput and latency counters
+#
+# requests are queued (bounded), grouped into small batches and sent to a
+# warm process pool, so callers pay neither interpreter startup nor table
+# setup per conversion.
+
+import argparse
+import asyncio
+import concurrent.futures
+import io
+import json
+import os
+import time
+import urllib.parse
+
+import converter
+
+stats = {
+    "started": time.time(),
+    "requests": 0,
+    "converted": 0,
+    "failed": 0,
+    "rejected": 0,
+    "batches": 0,
+    # requests that went through the queue, the ones latencyTotal covers
+    "timed": 0,
+    "latencyTotal": 0.0,
+    "latencyMax": 0.0,
+}
+
+
+def convert(text, name, startaddr, fmt):
+    # returns ("ok", bytes) or ("error", message), runs in a pool worker
+    try:
+        converter.checkName(name)
+        converter.checkStartAddr(startaddr)
+        basicBytes = converter.encodeLines(text.split("\n"), startaddr)
+    except ValueError as e:
+        return "error", str(e)
+    if fmt == "vz":
+        return "ok", converter.makeVZ(name, startaddr, basicBytes)
+    buf = io.BytesIO()
+    converter.writeWAV(
+        buf, converter.makeHead(name), converter.makeBody(basicBytes, startaddr)
+    )
+    return "ok", buf.getvalue()
+
+
+def convertBatch(jobs):
+    # one bad job must not fail the others batched with it
+    results = []
+    for job in jobs:
+        try:
+            results.append(convert(*job))
+        except Exception as e:
+            results.append(("error", "conversion failed: {}".format(e)))
+    return results
+
+
+def warm():
+    return convert("10 END", "WARM", 0x7AE9, "vz")[0]
+
+
+async def dispatcher(queue, pool, workers, batchSize):
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(workers)
+    # asyncio only keeps weak references to tasks
+    running = set()
+
+    async def runBatch(batch):
+        try:
+            results = await loop.run_in_executor(
+                pool, convertBatch, [job for job, future in batch]
+            )
+        except Exception as e:
+            results = [("error", "worker failed: {}".format(e))] * len(batch)
+        finally:
+            slots.release()
+        stats["batches"] += 1
+        for (job, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    while True:
+        batch = [await queue.get()]
+        # take whatever else is already waiting, up to batchSize
+        while len(batch) < batchSize and not queue.empty():
+            batch.append(queue.get_nowait())
+        await slots.acquire()
+        task = asyncio.create_task(runBatch(batch))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+
+async def respond(writer, status, body, contentType="text/plain; charset=utf-8"):
+    reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 503: "Busy"}
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    writer.write(
+        "HTTP/1.1 {} {}\r\nContent-Type: {}\r\nContent-Length: {}\r\n"
+        "Connection: close\r\n\r\n".format(
+            status, reasons.get(status, ""), contentType, len(body)
+        ).encode("ascii")
+    )
+    writer.write(body)
+    await writer.drain()
+    writer.close()
+
+
+def statsJSON():
+    uptime = time.time() - stats["started"]
+    done = stats["converted"] + stats["failed"]
+    timed = stats["timed"]
+    return json.dumps(
+        {
+            "uptime": round(uptime, 1),
+            "requests": stats["requests"],
+            "converted": stats["converted"],
+            "failed": stats["failed"],
+            "rejected": stats["rejected"],
+            "batches": stats["batches"],
+            "perSecond": round(done / uptime, 2) if uptime > 0 else 0,
+            "latencyAvgMs": round(stats["latencyTotal"] / timed * 1000, 2)
+            if timed > 0
+            else 0,
+            "latencyMaxMs": round(stats["latencyMax"] * 1000, 2),
+        }
+    )
+
+
+async def handle(reader, writer, queue):
+    try:
+        requestLine = (await reader.readline()).decode("latin-1").split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode("latin-1").strip()
+            if line == "":
+                break
+            k, _, v = line.partition(":")
+            headers[k.strip().lower()] = v.strip()
+        if len(requestLine) < 2:
+            await respond(writer, 400, "bad request line.")
+            return
+        method = requestLine[0]
+        url = urllib.parse.urlsplit(requestLine[1])
+        if method == "GET" and url.path == "/stats":
+            await respond(writer, 200, statsJSON(), "application/json")
+            return
+        if method != "POST" or url.path != "/convert":
+            await respond(writer, 404, "not found.")
+            return
+        stats["requests"] += 1
+        body = await reader.readexactly(int(headers.get("content-length", "0")))
+        query = urllib.parse.parse_qs(url.query)
+        name = query.get("name", [""])[0]
+        fmt = query.get("format", ["wav"])[0].lower()
+        try:
+            startaddr = int(query.get("addr", ["7AE9"])[0], 16)
+            text = body.decode("utf-8")
+        except (ValueError, UnicodeDecodeError):
+            stats["failed"] += 1
+            await respond(writer, 400, "invalid HexStartAddr or text.")
+            return
+        if name == "" or fmt not in ("wav", "vz"):
+            stats["failed"] += 1
+            await respond(writer, 400, "need name and format wav or vz.")
+            return
+        begin = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            queue.put_nowait(((text, name, startaddr, fmt), future))
+        except asyncio.QueueFull:
+            stats["rejected"] += 1
+            await respond(writer, 503, "queue full.")
+            return
+        status, result = await future
+        latency = time.perf_counter() - begin
+        stats["timed"] += 1
+        stats["latencyTotal"] += latency
+        stats["latencyMax"] = max(stats["latencyMax"], latency)
+        if status == "ok":
+            stats["converted"] += 1
+            contentType = "audio/wav" if fmt == "wav" else "application/octet-stream"
+            await respond(writer, 200, result, contentType)
+        else:
+            stats["failed"] += 1
+            await respond(writer, 400, result)
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        writer.close()
+
+
+async def serve(args):
+    pool = concurrent.futures.ProcessPoolExecutor(max_workers=args.workers)
+    loop = asyncio.get_running_loop()
+    # start every worker now so the first requests do not pay for it
+    await asyncio.gather(
+        *[loop.run_in_executor(pool, warm) for i in range(args.workers)]
+    )
+    queue = asyncio.Queue(maxsize=args.queue)
+    dispatcherTask = asyncio.create_task(
+        dispatcher(queue, pool, args.workers, args.batch)
+    )
+
+    async def onClient(reader, writer):
+        await handle(reader, writer, queue)
+
+    if args.unix != None:
+        server = await asyncio.start_unix_server(onClient, path=args.unix)
+        print("listening on {}".format(args.unix))
+    else:
+        server = await asyncio.start_server(onClient, args.host, args.port)
+        print("listening on http://{}:{}".format(args.host, args.port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        dispatcherTask.cancel()
+        pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8310)
+    parser.add_argument("--unix", help="listen on this unix socket instead of tcp")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--queue", type=int, default=64, help="max waiting requests")
+    parser.add_argument("--batch", type=int, default=8, help="max jobs per batch")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,59 @@
+# tests
+# incremental static checks shared by converter.py and BASICEditor.py
+# by odorajbotoj
+
+import unittest
+
+import checker
+import converter
+
+
+def setLine(cache, text):
+    lineNum, code, tokens = converter.tokenizeLine(text)
+    checker.setLine(cache, lineNum, text, code)
+
+
+class CheckerTest(unittest.TestCase):
+    def testJumpTargets(self):
+        cache = checker.newCache(converter.blockedBasicDict)
+        setLine(cache, "10 GOTO 20")
+        self.assertEqual(cache["count"], 1)
+        self.assertEqual(cache["problems"][10], ["jump to missing line 20."])
+        # adding the target rechecks the line jumping to it
+        setLine(cache, "20 END")
+        self.assertEqual(cache["count"], 0)
+        self.assertEqual(cache["problems"], {})
+        checker.removeLine(cache, 20)
+        self.assertEqual(cache["count"], 1)
+        # the new text no longer refers to 20
+        setLine(cache, "10 END")
+        self.assertEqual(cache["count"], 0)
+        self.assertEqual(cache["refs"][20], set())
+        setLine(cache, "20 GOSUB 10:PRINT \"A")
+        self.assertEqual(cache["problems"][20], ["unbalanced quote."])
+        checker.removeLine(cache, 10)
+        self.assertEqual(cache["count"], 2)
+        checker.syncLines(cache, [])
+        self.assertEqual(cache["count"], 0)
+        self.assertEqual(checker.allProblems(cache), [])
+
+    def testStatic(self):
+        cache = checker.newCache(converter.blockedBasicDict)
+        setLine(cache, '10 REM GOTO "')
+        setLine(cache, '20 PRINT "GOTO":GOTO')
+        setLine(cache, "30 SYSTEM")
+        self.assertEqual(
+            checker.allProblems(cache),
+            [(20, "GOTO without line number."), (30, "blocked token SYSTEM.")],
+        )
+
+    def testCheckFileEscapes(self):
+        # {lurd} is one char on the machine
+        problems = converter.checkFile(['10 PRINT "' + "{lurd}" * 20 + '"'])
+        self.assertEqual(problems, [])
+        problems = converter.checkFile(["10 END", "5 END"])
+        self.assertEqual(problems, [(5, "line number not increasing.")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+# tests
+# encoding and the line address symbol map
+# by odorajbotoj
+
+import unittest
+
+import converter
+
+
+class ConverterTest(unittest.TestCase):
+    def testSymbols(self):
+        content = ["10 REM HI", '20 PRINT "GOTO";1:GOTO 10']
+        symbols = []
+        basicBytes = converter.encodeLines(content, 0x7AE9, symbols=symbols)
+        self.assertEqual([(n, t) for n, a, l, t in symbols], [(10, 1), (20, 2)])
+        self.assertEqual(symbols[0][1], 0x7AE9)
+        for lineNum, addr, length, tokens in symbols:
+            p = addr - 0x7AE9
+            self.assertEqual(basicBytes[p] | basicBytes[p + 1] << 8, addr + length)
+            self.assertEqual(basicBytes[p + 2] | basicBytes[p + 3] << 8, lineNum)
+        # the symbols do not change the bytes
+        self.assertEqual(basicBytes, converter.encodeLines(content, 0x7AE9))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+# tests
+# runs fixed listings through the headless interpreter
+# by odorajbotoj
+
+# python -m unittest test_interpreter  (or python -m pytest)
+
+import unittest
+
+import interpreter
+
+
+def run(text, inputs=()):
+    return interpreter.runText(text.strip().split("\n"), inputs)
+
+
+class InterpreterTest(unittest.TestCase):
+    def testPrint(self):
+        r = run('10 A=2:B$="X"\n20 PRINT "A=";A;B$\n30 PRINT 1,2')
+        self.assertEqual(r["output"], "A= 2 X\n 1 " + " " * 13 + " 2 \n")
+
+    def testFlow(self):
+        r = run(
+            """
+10 FOR I=1 TO 3:GOSUB 100:NEXT
+20 IF S=6 THEN PRINT "OK" ELSE PRINT "BAD"
+30 END
+100 S=S+I:RETURN
+"""
+        )
+        self.assertEqual(r["output"], "OK\n")
+        self.assertEqual(r["hits"][100], 3)
+
+    def testDataAndInput(self):
+        r = run(
+            '10 READ A,B$:INPUT "N";N\n20 PRINT A*N;B$\n30 DATA 7,HI',
+            inputs=["3"],
+        )
+        self.assertEqual(r["output"], "N? 3\n 21 HI\n")
+
+    def testQuotedCommas(self):
+        r = run(
+            '10 READ A$,B$,C:INPUT D$,E$\n20 PRINT A$;"/";B$;"/";C;"/";D$;"/";E$\n'
+            '30 DATA "X,Y",Z, 3',
+            inputs=['"P,Q", R'],
+        )
+        self.assertEqual(r["output"], '? "P,Q", R\nX,Y/Z/ 3 /P,Q/R\n')
+
+    def testPrintUsing(self):
+        r = run(
+            """
+10 PRINT USING "###.##";3.14159
+20 PRINT USING "**$##.##";1.5
+30 PRINT USING "##.##-";-3
+40 PRINT USING "#,###";1234
+50 PRINT USING "##";123
+60 PRINT USING "!%  %";"HELLO";"WORLD"
+70 PRINT USING "X=## ";1;2;
+"""
+        )
+        self.assertEqual(
+            r["output"],
+            "  3.14\n***$1.50\n 3.00-\n1,234\n%123\nHWORL\nX= 1 X= 2 ",
+        )
+
+    def testPeekPoke(self):
+        r = run("10 POKE -28672,65:PRINT PEEK(36864)")
+        self.assertEqual(r["output"], " 65 \n")
+        self.assertEqual(r["memory"][0x9000], 65)
+
+    def testErrors(self):
+        with self.assertRaises(interpreter.BasicError):
+            run("10 GOTO 20")
+        with self.assertRaises(interpreter.BasicError):
+            interpreter.runText(["10 GOTO 10"], maxSteps=100)
+        with self.assertRaises(ValueError):
+            run('10 PRINT "’"')
+
+    def testRuntimeErrors(self):
+        # every runtime problem must come out as a BasicError
+        for text in [
+            '10 PRINT ASC("")',
+            "10 PRINT CHR$(256)",
+            '10 PRINT LEFT$("AB",-1)',
+            '10 PRINT MID$("AB",1,-1)',
+            '10 PRINT VAL("1E999")',
+            "10 A=1E30:B=A*A*A*A*A*A*A*A*A*A*A:PRINT B-B",
+        ]:
+            with self.assertRaises(interpreter.BasicError, msg=text):
+                run(text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,38 @@
+# tests
+# optimized listings must print the same as the originals
+# by odorajbotoj
+
+import unittest
+
+import interpreter
+import optimizer
+
+listing = """
+10 FOR I=1 TO 20:GOSUB 200:NEXT
+20 PRINT S:END
+100 PRINT "UNUSED":RETURN
+200 S=S+I:IF S>50 THEN GOSUB 300
+210 RETURN
+300 T=T+1:RETURN
+"""
+
+
+class OptimizerTest(unittest.TestCase):
+    def testSameOutput(self):
+        lines = optimizer.parseListing(listing.strip().split("\n"))
+        newLines, report = optimizer.optimize(lines)
+        self.assertNotEqual([n for n, body in newLines], [n for n, body in lines])
+        text = ["{} {}".format(n, body) for n, body in newLines]
+        self.assertEqual(
+            interpreter.runText(text)["output"],
+            interpreter.runText(listing.split("\n"))["output"],
+        )
+
+    def testMissingTarget(self):
+        lines = optimizer.parseListing(["10 GOTO 30", "20 IF X THEN 40", "30 END"])
+        with self.assertRaises(ValueError):
+            optimizer.optimize(lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+# tests
+# packed binaries must unpack to the same bytes in the interpreter
+# by odorajbotoj
+
+import random
+import unittest
+
+import interpreter
+import packer
+
+
+class PackerTest(unittest.TestCase):
+    def unpack(self, mode, data, dest):
+        lines, r = packer.pack(data, dest, 0x7AE9, mode)
+        text = ["{} {}".format(n, "".join(parts)) for n, parts in lines]
+        for line in text:
+            self.assertLessEqual(len(line), packer.maxLineLen)
+        return interpreter.runText(text)["memory"][dest : dest + len(data)]
+
+    def testRoundTrip(self):
+        data = bytes(random.Random(1).randrange(256) for i in range(100))
+        for mode in ("data", "rem"):
+            for dest in (0x9000, 0xFFFF - len(data)):
+                self.assertEqual(self.unpack(mode, data, dest), data, mode)
+
+    def testBadDest(self):
+        with self.assertRaises(ValueError):
+            packer.pack(b"\x01\x02", 0xFFFF, 0x7AE9, "data")
+        with self.assertRaises(ValueError):
+            packer.pack(b"", 0x9000, 0x7AE9, "rem")
+
+
+if __name__ == "__main__":
+    unittest.main()